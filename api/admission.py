@@ -0,0 +1,134 @@
+# api/admission.py — controle de admissão (backpressure) das rotas de dados/renderização
+import os, math, time, asyncio
+from collections import OrderedDict, deque
+
+# Quantas requisições/jobs ocupam vaga ao mesmo tempo (0 = sem limite).
+ADMISSION_LIMIT = int(os.getenv("ADMISSION_LIMIT", "8"))
+# Fila de espera: total, por cliente e tempo máximo até desistir com 429.
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "32"))
+ADMISSION_PER_CLIENT = int(os.getenv("ADMISSION_PER_CLIENT", "8"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "15"))
+# Teto do Retry-After sugerido (s).
+ADMISSION_RETRY_MAX = int(os.getenv("ADMISSION_RETRY_MAX", "60"))
+
+
+class Overloaded(Exception):
+    """Sem vaga: a API responde 429 com Retry-After."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Semáforo com fila de espera limitada e justa entre clientes (sessão ou IP).
+    Cada cliente tem a sua fila; ao liberar uma vaga, ela vai para o próximo
+    cliente em rodízio, então um lote de 30 atas de uma sessão não passa na
+    frente de quem chegou depois com uma só. Sem vaga nem lugar na fila, ou
+    depois de ADMISSION_MAX_WAIT, acquire() levanta Overloaded.
+
+    acquire() e release() rodam no event loop; de outra thread, use
+    release_threadsafe() (ex.: no término de um job).
+    """
+
+    def __init__(self, limit: int = ADMISSION_LIMIT, queue: int = ADMISSION_QUEUE,
+                 per_client: int = ADMISSION_PER_CLIENT, max_wait: float = ADMISSION_MAX_WAIT):
+        self.limit = limit
+        self.queue = queue
+        self.per_client = per_client
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: "OrderedDict[str, deque]" = OrderedDict()
+        self._waiting = 0
+        self._hold_ewma = 1.0  # s por vaga; base do Retry-After
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_per_client": 0,
+                       "rejected_timeout": 0, "max_waiting": 0, "wait_s_total": 0.0}
+
+    def retry_after(self) -> int:
+        # quanto a fila atual leva para andar, dado o tempo médio de cada vaga
+        slots = max(1, self.limit)
+        est = self._hold_ewma * (self._waiting + 1) / slots
+        return max(1, min(ADMISSION_RETRY_MAX, math.ceil(est)))
+
+    def _reject(self, reason: str):
+        self._stats[f"rejected_{reason}"] += 1
+        raise Overloaded(reason, self.retry_after())
+
+    async def acquire(self, client: str) -> float:
+        """Ocupa uma vaga (esperando na fila, se preciso). Devolve o instante da admissão."""
+        if self.limit <= 0 or (self.in_flight < self.limit and not self._waiting):
+            return self._admit()
+        if self._waiting >= self.queue:
+            self._reject("queue_full")
+        mine = self._waiters.setdefault(client, deque())
+        if len(mine) >= self.per_client:
+            if not mine:
+                del self._waiters[client]
+            self._reject("per_client")
+
+        fut = asyncio.get_running_loop().create_future()
+        mine.append(fut)
+        self._waiting += 1
+        self._stats["queued"] += 1
+        self._stats["max_waiting"] = max(self._stats["max_waiting"], self._waiting)
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.max_wait)
+        except asyncio.TimeoutError:
+            if not fut.done():
+                self._drop(client, fut)
+                self._reject("timeout")
+        except asyncio.CancelledError:
+            # cliente desconectou: devolve a vaga se ela chegou a ser concedida
+            if fut.done() and not fut.cancelled():
+                self.release(fut.result())
+            else:
+                self._drop(client, fut)
+            raise
+        self._stats["wait_s_total"] += time.perf_counter() - t0
+        return fut.result()
+
+    def _admit(self) -> float:
+        self.in_flight += 1
+        self._stats["admitted"] += 1
+        return time.perf_counter()
+
+    def _drop(self, client: str, fut):
+        mine = self._waiters.get(client)
+        if mine is not None and fut in mine:
+            mine.remove(fut)
+            self._waiting -= 1
+            if not mine:
+                del self._waiters[client]
+        fut.cancel()
+
+    def release(self, admitted_at: float | None = None) -> None:
+        if admitted_at is not None:
+            held = time.perf_counter() - admitted_at
+            self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * held
+        self.in_flight = max(0, self.in_flight - 1)
+        # rodízio: o primeiro cliente da fila recebe a vaga e vai para o fim
+        while self._waiters and (self.limit <= 0 or self.in_flight < self.limit):
+            client, mine = next(iter(self._waiters.items()))
+            fut = mine.popleft()
+            self._waiting -= 1
+            if mine:
+                self._waiters.move_to_end(client)
+            else:
+                del self._waiters[client]
+            if not fut.done():
+                fut.set_result(self._admit())
+
+    def release_threadsafe(self, loop, admitted_at: float | None = None) -> None:
+        loop.call_soon_threadsafe(self.release, admitted_at)
+
+    def stats(self) -> dict:
+        st = dict(self._stats)
+        rejected = st["rejected_queue_full"] + st["rejected_per_client"] + st["rejected_timeout"]
+        return {"limit": self.limit, "queue_max": self.queue, "per_client": self.per_client,
+                "max_wait_s": self.max_wait, "in_flight": self.in_flight, "waiting": self._waiting,
+                "waiting_clients": len(self._waiters), "rejected": rejected,
+                "avg_hold_s": round(self._hold_ewma, 3), "retry_after_s": self.retry_after(),
+                **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in st.items()}}
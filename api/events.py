@@ -0,0 +1,84 @@
+# api/events.py — eventos por sessão para o stream SSE (/events)
+import os, json, asyncio, threading
+
+# Eventos pendentes por conexão; se o cliente não acompanhar, descarta e manda
+# um retrato completo da fila na sequência (resync).
+SSE_QUEUE_MAX = int(os.getenv("SSE_QUEUE_MAX", "256"))
+# Conexões SSE simultâneas por worker (0 = sem limite).
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "200"))
+
+
+class Subscriber:
+    def __init__(self, session: str, loop, maxsize: int = SSE_QUEUE_MAX):
+        self.session = session
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, maxsize))
+        self.overflow = False
+
+    def push(self, event: str, data) -> None:
+        # roda no event loop do assinante
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            self.overflow = True
+
+
+class EventBus:
+    """
+    Pub/sub em memória, por sessão. publish() pode ser chamado de qualquer thread
+    (jobs, threadpool, process pool via callback): entrega no loop de cada assinante.
+    Só alcança conexões deste worker; o /events cobre os outros com um retrato
+    periódico da fila (ver SSE_HEARTBEAT no index).
+    """
+
+    def __init__(self, max_clients: int = SSE_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._subs: dict[str, set[Subscriber]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "delivered": 0, "connections_total": 0}
+
+    def subscribe(self, session: str) -> Subscriber | None:
+        """Novo assinante no loop corrente; None se já estiver no limite de conexões."""
+        sub = Subscriber(session, asyncio.get_running_loop())
+        with self._lock:
+            if self.max_clients > 0 and self._count() >= self.max_clients:
+                return None
+            self._subs.setdefault(session, set()).add(sub)
+            self._stats["connections_total"] += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.session)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.session]
+
+    def has_subscribers(self, session: str) -> bool:
+        with self._lock:
+            return bool(self._subs.get(session))
+
+    def publish(self, session: str, event: str, data) -> int:
+        with self._lock:
+            subs = list(self._subs.get(session, ()))
+            self._stats["published"] += 1
+            self._stats["delivered"] += len(subs)
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.push, event, data)
+            except RuntimeError:
+                pass  # loop já encerrado (shutdown)
+        return len(subs)
+
+    def _count(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"connections": self._count(), "sessions": len(self._subs),
+                    "max_clients": self.max_clients, **self._stats}
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
@@ -1,20 +1,39 @@
 from pathlib import Path
-import os, io, re, json
+import os, io, re, json, time, threading, hashlib, weakref
+_IMPORT_T0 = time.perf_counter()
+import importlib.util
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+from collections import OrderedDict
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
+import numpy as np
 import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+# reportlab e supabase são importados sob demanda (ver _pdf_lib e get_supabase):
+# cold start mais curto quando o worker acorda só para /options, /health etc.
 
-# Supabase (opcional)
+# Arrow (opcional) — sidecar colunar do dados.xlsx
 try:
-    from supabase import create_client, Client
-except Exception:  # deixa rodar mesmo sem lib instalada
-    create_client = None
-    class Client: ...
-    pass
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except Exception:
+    pa = None
+    pa_ipc = None
+
+# Métricas por etapa (api/metrics.py); fora da API as etapas não são medidas
+try:
+    from metrics import stage
+except Exception:
+    from contextlib import nullcontext
+    def stage(name): return nullcontext()
+
+# Supabase (opcional) — só importado se SUPABASE_URL/KEY estiverem definidos
+_SUPABASE_INSTALLED = importlib.util.find_spec("supabase") is not None
+if TYPE_CHECKING:
+    from supabase import Client
+# segundos gastos em cada import adiado (relatório de cold start)
+_lazy_import_seconds: dict[str, float] = {}
 
 def supabase_ping():
     # Faça um ping real se tiver SUPABASE_URL/KEY; por ora, retorne um status
@@ -28,10 +47,38 @@ BASE_DIR = Path(__file__).resolve().parent
 OBJETIVOS_JSON = os.getenv("OBJETIVOS_JSON", str(BASE_DIR / "data" / "objetivos.json"))
 PARTICIPANTES_XLSX_PATH = Path(os.getenv("PARTICIPANTES_XLSX_PATH", BASE_DIR / "data" / "dados.xlsx"))
 PARTICIPANTES_SHEET = os.getenv("PARTICIPANTES_SHEET", "profs")
+# Cópia Arrow IPC do dados.xlsx (dados.xlsx.arrow), refeita quando o xlsx muda
+XLSX_SIDECAR = os.getenv("XLSX_SIDECAR", "1") not in ("0", "false", "False", "")
+# Só as colunas que o COLUMN_MAP/infer_column_map usam saem do xlsx ("0" lê todas)
+XLSX_PROJECT = os.getenv("XLSX_PROJECT", "1") not in ("0", "false", "False", "")
 # ---------- CACHE ----------
 _participantes_cache = {"mtime": None, "lista": []}
 _supabase_client = None
 objetivos_map = {}
+# Dataset completo em memória, indexado pela versão (ver dataset_version()).
+# Com Supabase a versão vence a cada DATASET_CACHE_TTL segundos (0 desliga o cache).
+DATASET_CACHE_TTL = float(os.getenv("DATASET_CACHE_TTL", "60"))
+_dataset_lock = threading.RLock()
+_dataset_cache = {"version": None, "df": None}
+_dataset_stats = {"hits": 0, "misses": 0, "invalidations": 0, "generation": 0}
+# Supabase paginada: PostgREST corta em max-rows; buscamos por faixas, em paralelo
+SUPABASE_PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+SUPABASE_PAGE_WORKERS = int(os.getenv("SUPABASE_PAGE_WORKERS", "4"))
+SUPABASE_ORDER_COLUMN = os.getenv("SUPABASE_ORDER_COLUMN", "id")  # ordem estável entre páginas
+# Sem cache: "1" mantém duas consultas com filtro no servidor (em paralelo);
+# por padrão busca só o trimestre e deriva a turma localmente.
+SUPABASE_SPLIT_FETCH = os.getenv("SUPABASE_SPLIT_FETCH", "0") not in ("0", "false", "False", "")
+# Sincronização: "full" relê a tabela inteira quando a janela do TTL vence; "delta"
+# mantém o DF e busca só as linhas com SUPABASE_UPDATED_COLUMN acima da marca d'água,
+# mescladas pela chave primária (ver _delta_sync). Tombstones (SUPABASE_DELETED_COLUMN
+# preenchida) removem a linha; a reconciliação periódica pega deletes físicos.
+SUPABASE_SYNC = os.getenv("SUPABASE_SYNC", "full").strip().lower()
+SUPABASE_PK_COLUMN = os.getenv("SUPABASE_PK_COLUMN", "id")
+SUPABASE_UPDATED_COLUMN = os.getenv("SUPABASE_UPDATED_COLUMN", "updated_at")
+SUPABASE_DELETED_COLUMN = os.getenv("SUPABASE_DELETED_COLUMN", "")  # ex.: deleted_at; vazio = sem tombstones
+SUPABASE_SYNC_INTERVAL = float(os.getenv("SUPABASE_SYNC_INTERVAL", "5"))  # s entre consultas de delta
+SUPABASE_SYNC_OVERLAP = float(os.getenv("SUPABASE_SYNC_OVERLAP", "5"))  # s relidos antes da marca (commits atrasados)
+SUPABASE_RECONCILE_INTERVAL = float(os.getenv("SUPABASE_RECONCILE_INTERVAL", "900"))  # 0 = nunca
 
 # ---------- MAPA DE COLUNAS ----------
 # Mapa base (mantém compatibilidade com o que você já usa)
@@ -100,36 +147,100 @@ def _get_env():
 
 def _env_has_supabase():
     url, key, *_ = _get_env()
-    return bool(url) and bool(key) and create_client is not None
+    return bool(url) and bool(key) and _SUPABASE_INSTALLED
 
-def get_supabase() -> Client:
+def get_supabase() -> "Client":
     if not _env_has_supabase():
         raise RuntimeError("SUPABASE_URL/KEY não definidos ou pacote supabase ausente.")
     global _supabase_client
     if _supabase_client is None:
+        t0 = time.perf_counter()
+        from supabase import create_client
+        _lazy_import_seconds.setdefault("supabase", round(time.perf_counter() - t0, 4))
         url, key, *_ = _get_env()
         _supabase_client = create_client(url, key)
     return _supabase_client
 
-def fetch_supabase_df(ano=None, turno=None, turma=None, trimestre=None) -> pd.DataFrame:
+def _supabase_query(columns: str, ano=None, turno=None, turma=None, trimestre=None, count=None):
     sb = get_supabase()
     _, _, table, schema = _get_env()
-    q = sb.schema(schema).table(table).select("*")
+    q = sb.schema(schema).table(table).select(columns, count=count)
     if ano not in (None, ""): q = q.eq("ano", str(ano))
     if turno not in (None, ""): q = q.eq("turno", str(turno))
     if turma not in (None, ""): q = q.eq("turma", str(turma))
     if trimestre not in (None, ""):
         try: q = q.eq("trimestre", int(str(trimestre).strip()))
         except ValueError: pass
-    resp = q.execute()
-    return pd.DataFrame(resp.data or [])
+    return q
 
-def fetch_local_df(ano=None, turno=None, turma=None, trimestre=None) -> pd.DataFrame:
-    path = PARTICIPANTES_XLSX_PATH.parent / "dados.xlsx"
-    if not path.exists():
-        return pd.DataFrame()
-    df = pd.read_excel(path, engine="openpyxl")
-    # filtros simples
+def _projected_columns(df: pd.DataFrame) -> list[str]:
+    """Colunas que o infer_column_map usa (e a de ordenação), na ordem do DF."""
+    wanted = set(infer_column_map(df, COLUMN_MAP).values()) | {SUPABASE_ORDER_COLUMN}
+    if SUPABASE_SYNC == "delta":
+        wanted |= {SUPABASE_PK_COLUMN, SUPABASE_UPDATED_COLUMN, SUPABASE_DELETED_COLUMN}
+    return [c for c in df.columns if c in wanted]
+
+def fetch_supabase_df(ano=None, turno=None, turma=None, trimestre=None, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Busca paginada (offset/limit) com ordem estável. A 1ª página vem com count
+    exato e define as colunas (projeção pelo infer_column_map, se 'columns' não
+    for dado); as demais saem em paralelo (SUPABASE_PAGE_WORKERS) só com essas
+    colunas e viram DataFrames conforme chegam.
+    """
+    filtros = dict(ano=ano, turno=turno, turma=turma, trimestre=trimestre)
+    page = max(1, SUPABASE_PAGE_SIZE)
+    select = ",".join(columns) if columns else "*"
+
+    def _run(cols, start, end, count=None, ordered=True):
+        q = _supabase_query(cols, count=count, **filtros)
+        if ordered and SUPABASE_ORDER_COLUMN:
+            q = q.order(SUPABASE_ORDER_COLUMN)
+        return q.range(start, end).execute()
+
+    ordered = True
+    try:
+        first = _run(select, 0, page - 1, count="exact")
+    except Exception:
+        ordered = False  # coluna de ordenação inexistente: segue sem ordem
+        first = _run(select, 0, page - 1, count="exact", ordered=False)
+    first_df = pd.DataFrame(first.data or [])
+    if first_df.empty:
+        return first_df
+    cols = list(columns) if columns else _projected_columns(first_df)
+    first_df = first_df[[c for c in cols if c in first_df.columns]]
+
+    total = getattr(first, "count", None)
+    got = len(first_df)
+    # o servidor pode limitar abaixo do pedido (max-rows): usa o tamanho que veio
+    step = got if got < page else page
+    frames = {0: first_df}
+    if total is None:
+        # sem contagem: páginas em sequência até vir uma incompleta
+        start = got
+        while got == step:
+            resp = _run(",".join(cols), start, start + step - 1, ordered=ordered)
+            part = pd.DataFrame(resp.data or [])
+            got = len(part)
+            if got:
+                frames[start] = part
+            start += got
+    elif total > got:
+        starts = list(range(got, total, step))
+        workers = max(1, min(SUPABASE_PAGE_WORKERS, len(starts)))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(_run, ",".join(cols), st, st + step - 1, None, ordered): st for st in starts}
+            for fut in as_completed(futures):
+                frames[futures[fut]] = pd.DataFrame(fut.result().data or [])
+    parts = [frames[k] for k in sorted(frames) if not frames[k].empty]
+    return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+
+def _local_xlsx_path() -> Path:
+    return PARTICIPANTES_XLSX_PATH.parent / "dados.xlsx"
+
+def _filter_df(df: pd.DataFrame, ano=None, turno=None, turma=None, trimestre=None) -> pd.DataFrame:
+    """Aplica os filtros simples (case-insensitive) sobre um DF já carregado."""
+    if not isinstance(df, pd.DataFrame) or df.empty:
+        return df
     def _eq(col, val):
         return df[col].astype(str).str.strip().str.casefold() == str(val).strip().casefold()
     if "ano" in df.columns and ano not in (None, ""): df = df[_eq("ano", ano)]
@@ -139,25 +250,642 @@ def fetch_local_df(ano=None, turno=None, turma=None, trimestre=None) -> pd.DataF
         df = df[df["trimestre"].astype(str).str.contains(str(trimestre))]
     return df
 
-def get_df_for_filters(ano, turno, turma, trimestre):
+# ---------- LEITURA DO XLSX ----------
+# Uma passada em streaming (openpyxl read_only, values_only) por versão do arquivo:
+# aba principal (projetada) + aba de participantes. O DF fica aqui só até o cache
+# do dataset pegá-lo (_read_workbook(need_df=True)); a lista de participantes fica.
+_WORKBOOK_READER = "stream-1" + ("-proj" if XLSX_PROJECT else "")
+_workbook_cache: dict[str, dict] = {}
+_workbook_lock = threading.Lock()
+_workbook_stats = {"parses": 0, "last_parse_s": None, "last_rows": 0, "last_columns": 0}
+
+def _xlsx_cell(v, errors=()):
+    # mesma conversão do leitor openpyxl do pandas: vazio -> "", float inteiro -> int, erro -> NaN
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return int(v) if v.is_integer() else v
+    if isinstance(v, str) and v in errors:
+        return float("nan")
+    return v
+
+def _projected_idx(header: list) -> list[int] | None:
+    if not XLSX_PROJECT:
+        return None
+    names = [str(h) for h in header]
+    probe = pd.DataFrame([names], columns=names)
+    wanted = set(COLUMN_MAP.values()) | set(infer_column_map(probe, COLUMN_MAP).values())
+    return [i for i, n in enumerate(names) if n in wanted]
+
+def _read_sheet(ws, project: bool = True, errors=()) -> pd.DataFrame:
+    """Aba -> DF com a mesma inferência de tipos do pd.read_excel (TextParser), lendo só as colunas projetadas."""
+    from pandas.io.parsers import TextParser
+    ws.reset_dimensions()  # dimensões gravadas no arquivo podem estar erradas
+    rows = ws.iter_rows(values_only=True)
+    header = [_xlsx_cell(v, errors) for v in next(rows, ())]
+    while header and header[-1] == "":
+        header.pop()
+    if not header:
+        return pd.DataFrame()
+    idx = _projected_idx(header) if project else None
+    data = [header if idx is None else [header[i] for i in idx]]
+    last, width = 0, len(data[0])
+    for n, row in enumerate(rows, 1):
+        if idx is None:
+            vals = [_xlsx_cell(v, errors) for v in row]
+            while vals and vals[-1] == "":
+                vals.pop()
+            width = max(width, len(vals))
+            filled = bool(vals)
+        else:
+            filled = any(v is not None and v != "" for v in row)
+            vals = [_xlsx_cell(row[i], errors) if i < len(row) else "" for i in idx]
+        if filled:
+            last = n
+        data.append(vals)
+    del data[last + 1:]  # linhas vazias no fim não viram linhas de NaN
+    if idx is None:
+        data = [r + [""] * (width - len(r)) for r in data]
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+def _participantes_da_aba(ws, errors=()) -> list[str]:
+    from pandas.io.parsers import TextParser
+    ws.reset_dimensions()
+    data = [[_xlsx_cell(row[0] if row else None, errors)] for row in ws.iter_rows(max_col=1, values_only=True)]
+    if len(data) < 2:
+        return []
+    return _nomes_participantes(TextParser(data, header=0, dtype=str).read().iloc[:, 0])
+
+def _read_workbook(path: Path, need_df: bool = False) -> tuple[pd.DataFrame | None, list[str] | None]:
     """
-    Carrega DF principal e DF-base do trimestre. Retorna (df_filt, column_map, df_base_tri)
-    com column_map inferido para tolerar cabeçalhos variáveis.
+    (df da aba principal, participantes) do xlsx numa só abertura; participantes
+    None se a aba PARTICIPANTES_SHEET não existir. Com need_df, o DF sai do cache
+    (quem chama passa a ser o dono); sem, só a lista é garantida.
     """
+    path = Path(path)
+    sig = _xlsx_signature(path)
+    with _workbook_lock:
+        entry = _workbook_cache.get(str(path))
+        if entry is None or entry["sig"] != sig or (need_df and entry["df"] is None):
+            from openpyxl import load_workbook
+            from openpyxl.cell.cell import ERROR_CODES
+            t0 = time.perf_counter()
+            wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+            try:
+                main = wb.worksheets[0]
+                # a aba principal só é lida se for o dataset local (ou pedida)
+                local = path == _local_xlsx_path() and not _env_has_supabase()
+                df = _read_sheet(main, XLSX_PROJECT, ERROR_CODES) if need_df or local else None
+                part = _participantes_da_aba(wb[PARTICIPANTES_SHEET], ERROR_CODES) \
+                    if PARTICIPANTES_SHEET in wb.sheetnames else None
+            finally:
+                wb.close()
+            entry = _workbook_cache[str(path)] = {"sig": sig, "df": df, "participantes": part}
+            _workbook_stats.update(parses=_workbook_stats["parses"] + 1,
+                                   last_parse_s=round(time.perf_counter() - t0, 4),
+                                   last_rows=int(len(df)) if df is not None else 0,
+                                   last_columns=int(len(df.columns)) if df is not None else 0)
+        df = None
+        if need_df:
+            df, entry["df"] = entry["df"], None  # sem cópia duplicada em memória
+        return df, entry["participantes"]
+
+# ---------- SIDECAR COLUNAR ----------
+_SIDECAR_META_KEY = b"geraata_source"
+_SIDECAR_PART_KEY = b"geraata_participantes"
+
+def sidecar_path(xlsx_path: Path | None = None) -> Path:
+    xlsx_path = Path(xlsx_path or _local_xlsx_path())
+    return xlsx_path.with_name(xlsx_path.name + ".arrow")
+
+def _xlsx_signature(xlsx_path: Path) -> dict:
+    st = xlsx_path.stat()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "reader": _WORKBOOK_READER}
+
+def _arrow_safe_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Colunas object com tipos misturados (ex.: 5 e '5º') viram texto para caber no Arrow."""
+    out = df
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if out is df:
+                out = df.copy()
+            out[col] = df[col].map(lambda v: v if v is None or (isinstance(v, float) and v != v) else str(v))
+    return out
+
+def write_sidecar(df: pd.DataFrame, xlsx_path: Path | None = None, participantes: list[str] | None = None) -> Path | None:
+    """Grava o DF como Arrow IPC (sem compressão, para memory-map) ao lado do xlsx; participantes vão nos metadados."""
+    if pa is None:
+        return None
+    xlsx_path = Path(xlsx_path or _local_xlsx_path())
+    target = sidecar_path(xlsx_path)
+    table = pa.Table.from_pandas(_arrow_safe_df(df), preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[_SIDECAR_META_KEY] = json.dumps(_xlsx_signature(xlsx_path)).encode()
+    if participantes is not None:
+        meta[_SIDECAR_PART_KEY] = json.dumps(participantes, ensure_ascii=False).encode()
+    table = table.replace_schema_metadata(meta)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        with pa.OSFile(str(tmp), "wb") as sink, pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, target)  # troca atômica: leitores nunca veem arquivo pela metade
+    finally:
+        tmp.unlink(missing_ok=True)
+    return target
+
+def read_sidecar(xlsx_path: Path | None = None) -> pd.DataFrame | None:
+    """DF do sidecar se ele existir e corresponder ao xlsx atual (mtime/tamanho); senão None."""
+    if pa is None:
+        return None
+    xlsx_path = Path(xlsx_path or _local_xlsx_path())
+    target = sidecar_path(xlsx_path)
+    try:
+        with pa.memory_map(str(target), "r") as source:
+            reader = pa_ipc.open_file(source)
+            meta = (reader.schema.metadata or {}).get(_SIDECAR_META_KEY)
+            if not meta or json.loads(meta) != _xlsx_signature(xlsx_path):
+                return None
+            return reader.read_all().to_pandas()
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+def _sidecar_meta(xlsx_path: Path | None = None) -> dict | None:
+    """Metadados do schema do sidecar (só o schema é lido); None se não houver ou estiver velho."""
+    if pa is None:
+        return None
+    xlsx_path = Path(xlsx_path or _local_xlsx_path())
+    try:
+        with pa.memory_map(str(sidecar_path(xlsx_path)), "r") as source:
+            meta = pa_ipc.open_file(source).schema.metadata or {}
+        if not meta.get(_SIDECAR_META_KEY) or json.loads(meta[_SIDECAR_META_KEY]) != _xlsx_signature(xlsx_path):
+            return None
+        return meta
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+def sidecar_is_fresh(xlsx_path: Path | None = None) -> bool:
+    """O sidecar existe e corresponde ao xlsx atual (assinatura), com ou sem participantes."""
+    return _sidecar_meta(xlsx_path) is not None
+
+def read_sidecar_participantes(xlsx_path: Path | None = None) -> list[str] | None:
+    """Participantes gravados no sidecar; None se não houver aba, sidecar ou se ele estiver velho."""
+    raw = (_sidecar_meta(xlsx_path) or {}).get(_SIDECAR_PART_KEY)
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+def _read_local_xlsx(path: Path) -> pd.DataFrame:
+    """Lê o dados.xlsx passando pelo sidecar Arrow quando habilitado."""
+    if XLSX_SIDECAR:
+        df = read_sidecar(path)
+        if df is not None:
+            return df
+    df, participantes = _read_workbook(path, need_df=True)
+    if XLSX_SIDECAR:
+        try:
+            write_sidecar(df, path, participantes)
+        except Exception:
+            pass  # diretório só-leitura etc.: segue sem sidecar
+    return df
+
+def fetch_local_df(ano=None, turno=None, turma=None, trimestre=None) -> pd.DataFrame:
+    path = _local_xlsx_path()
+    if not path.exists():
+        return pd.DataFrame()
+    df = _read_local_xlsx(path)
+    return _filter_df(df, ano, turno, turma, trimestre)
+
+# ---------- SYNC INCREMENTAL (SUPABASE) ----------
+# DF local + marca d'água (maior SUPABASE_UPDATED_COLUMN já visto). A versão só
+# sobe quando um delta muda alguma linha de fato, então facetas, PDFs e rascunhos
+# continuam em cache enquanto a tabela não muda.
+_delta_lock = threading.Lock()
+_delta_state = {"df": None, "columns": None, "watermark": None, "version": 0, "unsupported": None,
+                "last_poll": 0.0, "last_reconcile": 0.0}
+_delta_stats = {"full_loads": 0, "polls": 0, "rows_fetched": 0, "changes": 0, "upserts": 0, "deletes": 0,
+                "reconciles": 0, "errors": 0, "last_error": None}
+
+class _DeltaUnsupported(Exception):
+    """Tabela sem a chave primária ou a coluna de atualização: volta ao modo full."""
+
+def _pg_value(v) -> str:
+    # valor para filtros or=(...)/in.(...) do PostgREST: aspas protegem ':', ',', '+' etc.
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return str(v)
+    return '"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def _ts(v):
+    return pd.to_datetime(v, utc=True, errors="coerce")
+
+def _delta_select(st) -> str:
+    return ",".join(st["columns"]) if st["columns"] else "*"
+
+def _delta_full_load(st) -> None:
+    upd, pk = SUPABASE_UPDATED_COLUMN, SUPABASE_PK_COLUMN
+    # marca d'água ANTES da carga: o que mudar durante a paginação volta no 1º delta
+    wm, wm_error = None, None
+    try:
+        top = _supabase_query(upd).order(upd, desc=True).limit(1).execute().data or []
+        wm = top[0].get(upd) if top else None
+    except Exception as e:
+        wm_error = e
+    df = fetch_supabase_df()
+    if not df.empty and not {pk, upd} <= set(df.columns):
+        raise _DeltaUnsupported(f"colunas {pk!r}/{upd!r} ausentes em {_get_env()[2]}")
+    if wm_error is not None:
+        raise wm_error
+    if SUPABASE_DELETED_COLUMN in df.columns:
+        df = df[df[SUPABASE_DELETED_COLUMN].isna()].reset_index(drop=True)
+    _delta_stats["full_loads"] += 1
+    st.update(df=df, columns=list(df.columns) or None, watermark=wm, version=st["version"] + 1,
+              last_poll=time.monotonic(), last_reconcile=time.monotonic())
+
+def _fetch_delta(st, since) -> pd.DataFrame:
+    """Linhas com atualização >= since, em páginas por keyset (updated, pk): estável mesmo com empates."""
+    upd, pk = SUPABASE_UPDATED_COLUMN, SUPABASE_PK_COLUMN
+    page = max(1, SUPABASE_PAGE_SIZE)
+    rows, last = [], None
+    while True:
+        q = _supabase_query(_delta_select(st))
+        if last is not None:
+            ts, key = _pg_value(last[upd]), _pg_value(last[pk])
+            q = q.or_(f"{upd}.gt.{ts},and({upd}.eq.{ts},{pk}.gt.{key})")
+        elif since is not None:
+            q = q.gte(upd, since)
+        data = q.order(upd).order(pk).limit(page).execute().data or []
+        if not data:
+            break  # o servidor pode cortar abaixo de 'page' (max-rows): só para na página vazia
+        rows += data
+        last = data[-1]
+    return pd.DataFrame(rows)
+
+def _delta_merge(df: pd.DataFrame, delta: pd.DataFrame) -> tuple[pd.DataFrame, int, int]:
+    """Aplica o delta por chave primária. Retorna (df, linhas inseridas/alteradas, removidas)."""
+    pk = SUPABASE_PK_COLUMN
+    delta = delta.drop_duplicates(pk, keep="last")
+    dead = delta[SUPABASE_DELETED_COLUMN].notna() if SUPABASE_DELETED_COLUMN in delta.columns else \
+        pd.Series(False, index=delta.index)
+    live = delta[~dead]
+    if df.empty and not len(df.columns):
+        return live.reset_index(drop=True), len(live), 0
+    live = live[[c for c in df.columns if c in live.columns]]
+    local_ids = df[pk]
+    gone = set(local_ids[local_ids.isin(delta.loc[dead, pk])])
+    # só conta como mudança o que difere da versão local (o overlap relê linhas já vistas)
+    new = live.set_index(pk)
+    old = df[local_ids.isin(new.index)].set_index(pk).reindex(index=new.index, columns=new.columns)
+    same = ((old == new) | (old.isna() & new.isna())).all(axis=1) & new.index.isin(local_ids)
+    changed = new.index[~same.to_numpy()]
+    if not len(changed) and not gone:
+        return df, 0, 0
+    touched = set(changed) | gone
+    merged = pd.concat([df[~local_ids.isin(touched)], live[live[pk].isin(changed)]], ignore_index=True)
+    if SUPABASE_ORDER_COLUMN in merged.columns:
+        # mesma ordem de uma carga completa (fetch_supabase_df ordena por essa coluna)
+        merged = merged.sort_values(SUPABASE_ORDER_COLUMN, kind="stable", ignore_index=True)
+    return merged, len(changed), len(gone)
+
+def _delta_apply(st, delta: pd.DataFrame) -> None:
+    df, up, dl = _delta_merge(st["df"], delta)
+    if up or dl:
+        if st["columns"] is None:
+            st["columns"] = _projected_columns(df) if not df.empty else None
+            df = df[st["columns"]] if st["columns"] else df
+        st.update(df=df, version=st["version"] + 1)
+        _delta_stats["changes"] += 1
+        _delta_stats["upserts"] += up
+        _delta_stats["deletes"] += dl
+
+def _delta_poll(st) -> None:
+    upd = SUPABASE_UPDATED_COLUMN
+    _delta_stats["polls"] += 1
+    since = None
+    if st["watermark"] is not None:
+        since = (_ts(st["watermark"]) - pd.Timedelta(seconds=SUPABASE_SYNC_OVERLAP)).isoformat()
+    delta = _fetch_delta(st, since)
+    _delta_stats["rows_fetched"] += len(delta)
+    if delta.empty:
+        return
+    stamps = _ts(delta[upd])
+    if stamps.notna().any():
+        top = delta[upd].iat[int(stamps.to_numpy().argmax())]
+        if st["watermark"] is None or _ts(top) > _ts(st["watermark"]):
+            st["watermark"] = top
+    _delta_apply(st, delta)
+
+def _delta_reconcile(st) -> None:
+    """Compara só as chaves com a tabela: remove deletes físicos e busca linhas que escaparam."""
+    pk, dead_col = SUPABASE_PK_COLUMN, SUPABASE_DELETED_COLUMN
+    _delta_stats["reconciles"] += 1
+    st["last_reconcile"] = time.monotonic()
+    cols = [pk] + ([dead_col] if dead_col and st["columns"] and dead_col in st["columns"] else [])
+    remote = fetch_supabase_df(columns=cols)
+    if dead_col in remote.columns:
+        remote = remote[remote[dead_col].isna()]
+    remote_ids = set(remote[pk]) if pk in remote.columns else set()
+    df = st["df"]
+    local_ids = df[pk] if pk in df.columns else pd.Series([], dtype=object)
+    stale = ~local_ids.isin(remote_ids)
+    missing = list(remote_ids - set(local_ids))
+    parts = []
+    for i in range(0, len(missing), 500):
+        parts += _supabase_query(_delta_select(st)).in_(pk, missing[i:i + 500]).execute().data or []
+    if stale.any():
+        st.update(df=df[~stale.to_numpy()].reset_index(drop=True), version=st["version"] + 1)
+        _delta_stats["changes"] += 1
+        _delta_stats["deletes"] += int(stale.sum())
+    if parts:
+        _delta_stats["rows_fetched"] += len(parts)
+        _delta_apply(st, pd.DataFrame(parts))
+
+def _delta_sync() -> int | None:
+    """
+    Sincroniza se já passou SUPABASE_SYNC_INTERVAL e devolve a versão do DF local.
+    None = sem DF local (falha na carga inicial ou tabela sem as colunas): use o modo full.
+    Erros de um delta mantêm o DF atual (servido um pouco defasado) e tentam de novo no próximo intervalo.
+    """
+    st = _delta_state
+    with _delta_lock:
+        if st["unsupported"]:
+            return None
+        now = time.monotonic()
+        try:
+            if st["df"] is None:
+                _delta_full_load(st)
+            elif now - st["last_poll"] >= SUPABASE_SYNC_INTERVAL:
+                st["last_poll"] = now
+                _delta_poll(st)
+                if 0 < SUPABASE_RECONCILE_INTERVAL <= now - st["last_reconcile"]:
+                    _delta_reconcile(st)
+        except _DeltaUnsupported as e:
+            st["unsupported"] = str(e)
+            return None
+        except Exception as e:
+            _delta_stats["errors"] += 1
+            _delta_stats["last_error"] = f"{type(e).__name__}: {e}"
+        return st["version"] if st["df"] is not None else None
+
+def _delta_reset() -> None:
+    with _delta_lock:
+        _delta_state.update(df=None, columns=None, watermark=None, unsupported=None)
+
+def delta_sync_stats() -> dict:
+    st = _delta_state
+    return {"mode": SUPABASE_SYNC, **_delta_stats, "version": st["version"], "watermark": st["watermark"],
+            "rows": int(len(st["df"])) if st["df"] is not None else 0, "unsupported": st["unsupported"]}
+
+# ---------- CACHE DO DATASET ----------
+def dataset_version() -> tuple:
+    """
+    Identifica a versão atual do dataset:
+      - Excel: (mtime_ns, tamanho) do dados.xlsx;
+      - Supabase: janela de DATASET_CACHE_TTL segundos;
+      - Supabase com SUPABASE_SYNC=delta: versão do DF local (sobe só quando um delta muda algo).
+    A geração (bump em invalidate_dataset_cache) entra em todos os casos.
+    """
+    gen = _dataset_stats["generation"]
+    if _env_has_supabase():
+        if SUPABASE_SYNC == "delta":
+            v = _delta_sync()
+            if v is not None:
+                return ("supabase", gen, "delta", v)
+        if DATASET_CACHE_TTL <= 0:
+            return ("supabase", gen, time.monotonic_ns())  # nunca repete -> sem cache
+        return ("supabase", gen, int(time.time() // DATASET_CACHE_TTL))
+    try:
+        st = _local_xlsx_path().stat()
+        return ("xlsx", gen, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return ("xlsx", gen, None, None)
+
+def dataset_last_modified() -> float | None:
+    """mtime do dados.xlsx (Last-Modified das respostas HTTP); None com Supabase."""
+    if _env_has_supabase():
+        return None
+    try:
+        return _local_xlsx_path().stat().st_mtime
+    except OSError:
+        return None
+
+def _dataset_cache_enabled() -> bool:
+    return DATASET_CACHE_TTL > 0 or not _env_has_supabase()
+
+def _load_dataset_uncached() -> tuple[pd.DataFrame, bool]:
+    """Lê o dataset inteiro da fonte. Retorna (df, cacheavel)."""
     if _env_has_supabase():
+        if SUPABASE_SYNC == "delta" and _delta_state["df"] is not None:
+            return _delta_state["df"], True
         try:
-            df_filt = fetch_supabase_df(ano=ano, turno=turno, turma=turma, trimestre=trimestre)
-            df_base_tri = fetch_supabase_df(ano=None, turno=None, turma=None, trimestre=trimestre)
+            df = fetch_supabase_df(ano=None, turno=None, turma=None, trimestre=None)
+            return df, _dataset_cache_enabled()
         except Exception:
-            df_filt = fetch_local_df(ano, turno, turma, trimestre)
-            df_base_tri = fetch_local_df(None, None, None, trimestre)
-    else:
-        df_filt = fetch_local_df(ano, turno, turma, trimestre)
-        df_base_tri = fetch_local_df(None, None, None, trimestre)
+            # mesmo fallback do get_df_for_filters; não cacheia para tentar a Supabase de novo
+            return fetch_local_df(None, None, None, None), False
+    return fetch_local_df(None, None, None, None), True
+
+def get_dataset_versioned() -> tuple[pd.DataFrame, tuple | None]:
+    """
+    (df, versão) lidos atomicamente; versão None quando o DF não foi cacheado.
+    Use para chavear caches derivados (facetas, índices).
+    """
+    version = dataset_version()
+    with _dataset_lock:
+        if _dataset_cache["version"] == version and _dataset_cache["df"] is not None:
+            _dataset_stats["hits"] += 1
+            return _dataset_cache["df"], version
+        _dataset_stats["misses"] += 1
+        df, cacheable = _load_dataset_uncached()
+        if not isinstance(df, pd.DataFrame):
+            df = pd.DataFrame()
+        if cacheable:
+            _dataset_cache.update({"version": version, "df": df})
+        return df, (version if cacheable else None)
+
+def get_dataset() -> pd.DataFrame:
+    """
+    DF completo compartilhado pelo processo (somente leitura!).
+    Recarrega da fonte apenas quando dataset_version() muda.
+    """
+    return get_dataset_versioned()[0]
+
+def invalidate_dataset_cache() -> dict:
+    """Descarta o dataset em memória; o próximo acesso relê da fonte."""
+    with _dataset_lock:
+        _dataset_cache.update({"version": None, "df": None})
+        _dataset_stats["invalidations"] += 1
+        _dataset_stats["generation"] += 1
+    with _workbook_lock:
+        _workbook_cache.clear()
+    if SUPABASE_SYNC == "delta":
+        _delta_reset()  # relê a tabela inteira na próxima consulta
+    return dataset_cache_stats()
+
+def dataset_cache_stats() -> dict:
+    with _dataset_lock:
+        total = _dataset_stats["hits"] + _dataset_stats["misses"]
+        df = _dataset_cache["df"]
+        return {
+            **_dataset_stats,
+            "hit_ratio": (_dataset_stats["hits"] / total) if total else 0.0,
+            "loaded": df is not None,
+            "rows": int(len(df)) if df is not None else 0,
+            "version": list(_dataset_cache["version"]) if _dataset_cache["version"] else None,
+            "workbook": dict(_workbook_stats),
+            "row_index": dict(_row_index_stats),
+            **({"sync": delta_sync_stats()} if SUPABASE_SYNC == "delta" else {}),
+        }
+
+# ---------- ÍNDICE DE LINHAS ----------
+# Por versão do dataset: cada chave (ano, turno, turma, trimestre) fatorada uma vez
+# em códigos, e as posições das linhas agrupadas por combinação de códigos. Um
+# filtro avalia o critério só nos valores distintos (mesma semântica do _filter_df)
+# e vira a junção das posições dos grupos que casam — sem varrer o DF.
+# As fatias só de trimestre ficam guardadas no índice: o mesmo objeto volta em toda
+# requisição da versão, e o mapa do Integral (integral_map_for) é reaproveitado.
+ROW_INDEX_SLICES = int(os.getenv("ROW_INDEX_SLICES", "8"))
+_ROW_KEYS = ("ano", "turno", "turma", "trimestre")
+_row_index_cache = {"version": None, "index": None}
+_row_index_stats = {"builds": 0, "last_build_s": None, "groups": 0}
+
+class RowIndex:
+    """Posições de linha por combinação (ano, turno, turma, trimestre) de um DF."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.rows = int(len(df))
+        self.keys = [k for k in _ROW_KEYS if k in df.columns]  # chave ausente: critério ignorado
+        self.values = {}  # chave -> valores distintos como texto (astype(str), igual ao filtro)
+        codes = []
+        for k in self.keys:
+            c, uniques = pd.factorize(df[k], use_na_sentinel=False)
+            self.values[k] = pd.Series(uniques, dtype=df[k].dtype).astype(str)
+            codes.append(c.astype(np.int32, copy=False))
+        if not codes:
+            self.groups, self.positions = np.zeros((1, 0), dtype=np.int32), [np.arange(self.rows, dtype=np.int32)]
+            return
+        self.groups, gid = np.unique(np.column_stack(codes), axis=0, return_inverse=True)
+        gid = gid.reshape(-1)
+        order = np.argsort(gid, kind="stable").astype(np.int32)  # dentro do grupo, ordem original
+        bounds = np.cumsum(np.bincount(gid, minlength=len(self.groups)))[:-1]
+        self.positions = np.split(order, bounds)
+        self._slices: dict[bytes, pd.DataFrame] = {}
+
+    def _allowed(self, key: str, val) -> np.ndarray | None:
+        """Máscara sobre os valores distintos da chave; None = sem critério."""
+        if key not in self.values or val in (None, ""):
+            return None
+        vals = self.values[key]
+        if key == "trimestre":
+            ok = vals.str.contains(str(val))
+        else:
+            ok = vals.str.strip().str.casefold() == str(val).strip().casefold()
+        return ok.fillna(False).to_numpy(dtype=bool)
+
+    def _select(self, ano=None, turno=None, turma=None, trimestre=None) -> np.ndarray | None:
+        """Máscara sobre os grupos; None = nenhum critério (todas as linhas)."""
+        sel, any_filter = np.ones(len(self.groups), dtype=bool), False
+        for i, k in enumerate(self.keys):
+            allowed = self._allowed(k, {"ano": ano, "turno": turno, "turma": turma, "trimestre": trimestre}[k])
+            if allowed is not None:
+                sel &= allowed[self.groups[:, i]]
+                any_filter = True
+        return sel if any_filter else None
+
+    def _positions(self, sel: np.ndarray) -> np.ndarray:
+        picked = [self.positions[g] for g in np.flatnonzero(sel)]
+        if not picked:
+            return np.zeros(0, dtype=np.int32)
+        return np.sort(np.concatenate(picked)) if len(picked) > 1 else picked[0]
+
+    def positions_for(self, **filtros) -> np.ndarray | None:
+        """Posições (ordem original) das linhas que casam; None = nenhum critério (todas)."""
+        sel = self._select(**filtros)
+        return None if sel is None else self._positions(sel)
+
+    def take(self, df: pd.DataFrame, shared: bool = False, **filtros) -> pd.DataFrame:
+        """Fatia do df; com shared, a mesma seleção devolve sempre o mesmo objeto (somente leitura!)."""
+        sel = self._select(**filtros)
+        if sel is None:
+            return df
+        if not shared:
+            return df.iloc[self._positions(sel)]
+        key = sel.tobytes()  # "1", " 1" etc. caem na mesma fatia
+        hit = self._slices.get(key)
+        if hit is None:
+            hit = df.iloc[self._positions(sel)]
+            if len(self._slices) >= ROW_INDEX_SLICES:
+                self._slices.pop(next(iter(self._slices)), None)
+            self._slices[key] = hit
+        return hit
+
+def build_row_index(df: pd.DataFrame) -> RowIndex:
+    t0 = time.perf_counter()
+    index = RowIndex(df)
+    _row_index_stats.update(builds=_row_index_stats["builds"] + 1,
+                            last_build_s=round(time.perf_counter() - t0, 4), groups=int(len(index.groups)))
+    return index
+
+def get_row_index(df: pd.DataFrame, version) -> RowIndex | None:
+    """Índice da versão dada do dataset (construído só quando ela muda); None se o DF não é cacheado."""
+    if version is None or not isinstance(df, pd.DataFrame) or df.empty:
+        return None
+    with _dataset_lock:
+        cached = _row_index_cache["index"]
+        if cached is not None and _row_index_cache["version"] == version:
+            return cached
+    index = build_row_index(df)
+    with _dataset_lock:
+        _row_index_cache.update({"version": version, "index": index})
+    return index
+
+def _filter_dataset(ano=None, turno=None, turma=None, trimestre=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(df_filt, df_base_tri) do dataset em memória via índice de linhas (ou _filter_df, sem índice)."""
+    df, version = get_dataset_versioned()
+    index = get_row_index(df, version)
+    if index is None:
+        df_base_tri = _filter_df(df, trimestre=trimestre)
+        return _filter_df(df_base_tri, ano=ano, turno=turno, turma=turma), df_base_tri
+    return (index.take(df, ano=ano, turno=turno, turma=turma, trimestre=trimestre),
+            index.take(df, shared=True, trimestre=trimestre))
+
+def _fetch_supabase_filt_and_tri(ano, turno, turma, trimestre) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (df_filt, df_base_tri) direto da Supabase. O filtrado é subconjunto do trimestre,
+    então por padrão faz UMA consulta e filtra a turma em memória; com
+    SUPABASE_SPLIT_FETCH as duas consultas saem em paralelo.
+    """
+    if SUPABASE_SPLIT_FETCH:
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            f_filt = ex.submit(fetch_supabase_df, ano, turno, turma, trimestre)
+            f_tri = ex.submit(fetch_supabase_df, None, None, None, trimestre)
+            return f_filt.result(), f_tri.result()
+    df_base_tri = fetch_supabase_df(ano=None, turno=None, turma=None, trimestre=trimestre)
+    return _filter_df(df_base_tri, ano=ano, turno=turno, turma=turma), df_base_tri
+
+def get_df_for_filters(ano, turno, turma, trimestre):
+    """
+    Carrega DF principal e DF-base do trimestre. Retorna (df_filt, column_map, df_base_tri)
+    com column_map inferido para tolerar cabeçalhos variáveis.
+    Com o cache ligado, ambos são fatias do dataset em memória (get_dataset).
+    """
+    with stage("fetch"):
+        if _dataset_cache_enabled():
+            df_filt, df_base_tri = _filter_dataset(ano, turno, turma, trimestre)
+        else:
+            try:
+                df_filt, df_base_tri = _fetch_supabase_filt_and_tri(ano, turno, turma, trimestre)
+            except Exception:
+                df_base_tri = fetch_local_df(None, None, None, trimestre)
+                df_filt = _filter_df(df_base_tri, ano=ano, turno=turno, turma=turma)
 
     # Escolhe um DF de referência (o próprio filtrado, se houver; senão, o base do trimestre)
     ref_df = df_filt if (df_filt is not None and not df_filt.empty) else df_base_tri
-    colmap = infer_column_map(ref_df, COLUMN_MAP)
+    with stage("infer_column_map"):
+        colmap = infer_column_map(ref_df, COLUMN_MAP)
     return df_filt, colmap, df_base_tri
 
 # ---------- PARTICIPANTES ----------
@@ -168,19 +896,29 @@ def load_participantes_from_xlsx(force=False) -> list[str]:
         mtime = os.path.getmtime(PARTICIPANTES_XLSX_PATH)
         if (not force) and _participantes_cache["mtime"] == mtime and _participantes_cache["lista"]:
             return _participantes_cache["lista"]
-        dfp = pd.read_excel(PARTICIPANTES_XLSX_PATH, sheet_name=PARTICIPANTES_SHEET, usecols=[0], header=0, dtype=str)
-        serie = dfp.iloc[:,0].dropna()
-        nomes, seen = [], set()
-        for s in map(str.strip, serie):
-            if not s or s.lower() in {"professor","professores","nome","participante"}: continue
-            key = s.casefold()
-            if key in seen: continue
-            seen.add(key); nomes.append(s)
+        # sidecar (sem abrir o xlsx) -> cache da última passada no workbook -> nova passada
+        nomes = read_sidecar_participantes(PARTICIPANTES_XLSX_PATH) if XLSX_SIDECAR and not force else None
+        if nomes is None:
+            if force:
+                with _workbook_lock:
+                    _workbook_cache.pop(str(Path(PARTICIPANTES_XLSX_PATH)), None)
+            _, nomes = _read_workbook(PARTICIPANTES_XLSX_PATH)
+        if nomes is None:
+            return []  # sem a aba PARTICIPANTES_SHEET
         _participantes_cache.update({"mtime": mtime, "lista": nomes})
         return nomes
     except Exception:
         return []
 
+def _nomes_participantes(serie) -> list[str]:
+    nomes, seen = [], set()
+    for s in map(str.strip, serie.dropna()):
+        if not s or s.lower() in {"professor","professores","nome","participante"}: continue
+        key = s.casefold()
+        if key in seen: continue
+        seen.add(key); nomes.append(s)
+    return nomes
+
 # ---------- TEXTO / FORMATADORES ----------
 MESES = ["janeiro","fevereiro","março","abril","maio","junho","julho","agosto","setembro","outubro","novembro","dezembro"]
 
@@ -271,46 +1009,98 @@ def filtra_integral_df(df_base_tri: pd.DataFrame, column_map: dict, ano_num: int
     if wanted is None or tri_col not in df_base_tri.columns:
         return df_base_tri
 
-    return df_base_tri[df_base_tri[tri_col].map(_to_int) == wanted]
+    # _to_int só nos valores distintos; a seleção das linhas é vetorial
+    col = df_base_tri[tri_col]
+    ok = [v for v in col.drop_duplicates().tolist() if _to_int(v) == wanted]
+    return df_base_tri[col.isin(ok)]
+
+def _as_text(series: pd.Series) -> pd.Series:
+    """Equivalente vetorial de str(valor) célula a célula (NaN vira 'nan', como antes)."""
+    return pd.Series([str(v) for v in series.tolist()], index=series.index, dtype=object)
 
-def montar_partes_por_aluno(df_filt: pd.DataFrame, df_integral: pd.DataFrame, column_map: dict) -> list[str]:
+def _pecas_por_linha(df: pd.DataFrame, mat_col: str, desc_col: str) -> tuple:
+    """
+    ('matéria: descrição.' das linhas com matéria e descrição não vazias, máscara dessas linhas).
+    As peças vêm com índice novo (posicional), o que tolera índices duplicados no df.
+    """
+    if mat_col not in df.columns or desc_col not in df.columns:
+        return pd.Series([], dtype=object), None
+    mat = _as_text(df[mat_col]).str.strip()
+    desc = _as_text(df[desc_col]).str.strip()
+    ok = ((mat != "") & (desc != "")).to_numpy()
+    pecas = pd.Series(mat.to_numpy()[ok], dtype=object) + ": " + pd.Series(desc.to_numpy()[ok], dtype=object)
+    # ensure_ponto: já sem espaços nas pontas, basta olhar o último caractere
+    return pecas.where(pecas.str[-1].isin([".", "!", "?"]), pecas + "."), ok
+
+def _pecas_agrupadas(df: pd.DataFrame, column_map: dict) -> tuple[pd.Index, dict]:
+    """(alunos na ordem do groupby, {aluno: peças já unidas por espaço})."""
+    alunos = df[column_map["aluno"]]
+    ordem = alunos.groupby(alunos, sort=True).size().index
+    pecas, ok = _pecas_por_linha(df, column_map["materia"], column_map["descricao"])
+    if pecas.empty:
+        return ordem, {}
+    juntas = pecas.groupby(alunos.to_numpy()[ok], sort=False).agg(" ".join)
+    return ordem, dict(zip(juntas.index, juntas.tolist()))
+
+def montar_integral_map(df_integral: pd.DataFrame, column_map: dict) -> dict:
+    """Texto do 'Integral' por aluno (chave: nome com strip)."""
+    if not isinstance(df_integral, pd.DataFrame) or df_integral.empty:
+        return {}
+    ordem, juntas = _pecas_agrupadas(df_integral, column_map)
+    return {str(aluno).strip(): juntas[aluno] for aluno in ordem if aluno in juntas}
+
+# Mapa do Integral por DF-base do trimestre: o mesmo para todas as turmas do
+# trimestre. Chave id(df) + conferência pelo weakref; a entrada some junto com o DF
+# (as fatias compartilhadas vivem no índice de linhas da versão do dataset).
+_integral_cache: dict[int, tuple] = {}
+_integral_lock = threading.Lock()
+_integral_stats = {"hits": 0, "misses": 0}
+
+def integral_map_for(df_base_tri: pd.DataFrame, column_map: dict, trimestre) -> dict:
+    """montar_integral_map(filtra_integral_df(...)) calculado uma vez por DF-base/trimestre (somente leitura!)."""
+    if not isinstance(df_base_tri, pd.DataFrame) or df_base_tri.empty:
+        return {}
+    key = (str(trimestre).strip(), *(column_map.get(k) for k in ("trimestre", "aluno", "materia", "descricao")))
+    with _integral_lock:
+        entry = _integral_cache.get(id(df_base_tri))
+        if entry is not None and entry[0]() is df_base_tri and key in entry[1]:
+            _integral_stats["hits"] += 1
+            return entry[1][key]
+        _integral_stats["misses"] += 1
+    with stage("integral"):
+        mapa = montar_integral_map(filtra_integral_df(df_base_tri, column_map, None, trimestre), column_map)
+    with _integral_lock:
+        entry = _integral_cache.get(id(df_base_tri))
+        if entry is None or entry[0]() is not df_base_tri:
+            entry = _integral_cache[id(df_base_tri)] = (weakref.ref(df_base_tri), {})
+            weakref.finalize(df_base_tri, _integral_cache.pop, id(df_base_tri), None)
+        entry[1][key] = mapa
+    return mapa
+
+def integral_cache_stats() -> dict:
+    with _integral_lock:
+        total = _integral_stats["hits"] + _integral_stats["misses"]
+        return {**_integral_stats, "hit_ratio": (_integral_stats["hits"] / total) if total else 0.0,
+                "frames": len(_integral_cache)}
+
+def montar_partes_por_aluno(df_filt: pd.DataFrame, df_integral: pd.DataFrame, column_map: dict,
+                            integral_map: dict | None = None) -> list[str]:
     """
     Monta blocos do tipo:
       'Aluno: matéria: descrição. ... Integral: matéria: descrição. ...'
-    Se df_integral estiver vazio/None, gera apenas com df_filt.
+    Se df_integral estiver vazio/None, gera apenas com df_filt. integral_map
+    (ver integral_map_for) dispensa o df_integral.
     """
-    alu_col = column_map["aluno"]
-    mat_col = column_map["materia"]
-    desc_col = column_map["descricao"]
+    if integral_map is None:
+        integral_map = montar_integral_map(df_integral, column_map)
+    ordem, juntas = _pecas_agrupadas(df_filt, column_map)
 
     blocos = []
-
-    # Índice do Integral por aluno
-    integral_map = {}
-    if isinstance(df_integral, pd.DataFrame) and not df_integral.empty:
-        for aluno_i, gi in df_integral.groupby(alu_col):
-            pecas_i = []
-            for _, row in gi.iterrows():
-                imat = str(row.get(mat_col, "")).strip()
-                idesc = str(row.get(desc_col, "")).strip()
-                if imat and idesc:
-                    pecas_i.append(ensure_ponto(f"{imat}: {idesc}"))
-            if pecas_i:
-                integral_map[str(aluno_i).strip()] = " ".join(pecas_i)
-
-    # Blocos principais por aluno
-    for aluno, g in df_filt.groupby(alu_col):
-        pecas = []
-        for _, row in g.iterrows():
-            materia = str(row.get(mat_col, "")).strip()
-            desc = str(row.get(desc_col, "")).strip()
-            if materia and desc:
-                pecas.append(ensure_ponto(f"{materia}: {desc}"))
-
+    for aluno in ordem:
+        pecas = [juntas[aluno]] if aluno in juntas else []
         extra = integral_map.get(str(aluno).strip())
         if extra:
             pecas.append(ensure_ponto(f"Integral: {extra}"))
-
         if pecas:
             blocos.append(ensure_ponto(f"{aluno}: " + " ".join(pecas)))
 
@@ -318,8 +1108,9 @@ def montar_partes_por_aluno(df_filt: pd.DataFrame, df_integral: pd.DataFrame, co
 
 
 # ---------- TEXTO COMPLETO ----------
-def compose_text_core(df_filt, df_base_tri, column_map, numero_ata, data_reuniao, horario_inicio, horario_fim,
-                      presidente, participantes, ano, turma, turno, trimestre)->str:
+def _compose_secoes(df_filt, df_base_tri, column_map, numero_ata, data_reuniao, horario_inicio, horario_fim,
+                    presidente, participantes, ano, turma, turno, trimestre) -> tuple:
+    """(abertura, objetivos, introdução, blocos por estudante, encerramento)."""
     ano_num = normaliza_ano_num(ano)
     tri_label = rotulo_trimestre(trimestre)
     turno_fmt = str(turno).strip().capitalize()
@@ -343,41 +1134,139 @@ def compose_text_core(df_filt, df_base_tri, column_map, numero_ata, data_reuniao
         f"{turno_fmt}, referentes a {tri_label}. "
     )
 
-    df_integral = filtra_integral_df(df_base_tri, column_map, ano_num, trimestre)
-    blocos = montar_partes_por_aluno(df_filt, df_integral, column_map)
-    estudantes_txt = (" ".join(blocos)).strip()
+    blocos = montar_partes_por_aluno(df_filt, None, column_map,
+                                     integral_map=integral_map_for(df_base_tri, column_map, trimestre))
 
     encerramento = (
         f"Os encaminhamentos necessários serão retomados nos momentos de pós-conselho. "
         f"Nada mais havendo a tratar, eu {presidente}, na qualidade de presidente do conselho, "
         f"encerro a presente ata às {hora_por_extenso(horario_fim)}, que vai assinada por mim e pelos demais presentes."
     )
+    return abertura, objetivos_txt, intro, blocos, encerramento
+
+def _texto_de_secoes(secoes: tuple) -> str:
+    abertura, objetivos_txt, intro, blocos, encerramento = secoes
+    estudantes_txt = (" ".join(blocos)).strip()
     return " ".join([abertura, objetivos_txt, intro, estudantes_txt, encerramento]).replace("  ", " ").strip()
 
+def compose_text_core(df_filt, df_base_tri, column_map, numero_ata, data_reuniao, horario_inicio, horario_fim,
+                      presidente, participantes, ano, turma, turno, trimestre)->str:
+    with stage("compose"):
+        return _texto_de_secoes(_compose_secoes(
+            df_filt, df_base_tri, column_map, numero_ata, data_reuniao, horario_inicio, horario_fim,
+            presidente, participantes, ano, turma, turno, trimestre))
+
+# ---------- RASCUNHOS (compose_text -> queue_ata) ----------
+# Texto composto guardado por filtros + dados da reunião + versão do dataset.
+# O token devolvido no /compose_text permite ao /queue_ata renderizar direto.
+DRAFT_CACHE_SIZE = int(os.getenv("DRAFT_CACHE_SIZE", "256"))
+DRAFT_CACHE_TTL = float(os.getenv("DRAFT_CACHE_TTL", "3600"))
+DRAFT_FIELDS = ("ano", "turno", "turma", "trimestre", "numero_ata", "data_reuniao",
+                "horario_inicio", "horario_fim", "presidente", "participantes")
+_draft_cache: "OrderedDict[str, dict]" = OrderedDict()
+_draft_lock = threading.Lock()
+_draft_stats = {"hits": 0, "misses": 0}
+
+def _draft_params(payload: dict) -> list[str]:
+    return [str(payload.get(f) or "").strip() for f in DRAFT_FIELDS]
+
+def draft_token(payload: dict, version=None) -> str:
+    version = dataset_version() if version is None else version
+    raw = json.dumps([list(version), _draft_params(payload)], ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def get_draft(token: str | None, payload: dict | None = None) -> dict | None:
+    """
+    Rascunho do token, se ainda válido: dentro do TTL e da versão atual do dataset.
+    Com payload, exige que os campos batam (o usuário pode ter mudado algo depois
+    da pré-visualização).
+    """
+    if not token:
+        return None
+    version = dataset_version()
+    with _draft_lock:
+        draft = _draft_cache.get(token)
+        if draft is not None and (time.time() - draft["created_at"] > DRAFT_CACHE_TTL
+                                  or draft["version"] != version):
+            del _draft_cache[token]  # expirado ou composto com dados antigos
+            draft = None
+        if draft is not None and payload is not None and draft["params"] != _draft_params(payload):
+            draft = None
+        if draft is None:
+            _draft_stats["misses"] += 1
+            return None
+        _draft_cache.move_to_end(token)
+        _draft_stats["hits"] += 1
+        return draft
+
+def compose_draft(payload: dict) -> dict:
+    """
+    {"token", "texto"} para o payload do /compose_text ou /queue_ata,
+    reaproveitando o rascunho da mesma versão do dataset quando existir.
+    """
+    version = dataset_version()
+    token = draft_token(payload, version)
+    draft = get_draft(token)
+    if draft is not None:
+        return draft
+    df_filt, colmap, df_base_tri = get_df_for_filters(
+        ano=payload.get("ano"), turno=payload.get("turno"),
+        turma=payload.get("turma"), trimestre=payload.get("trimestre"))
+    with stage("compose"):
+        secoes = _compose_secoes(
+            df_filt, df_base_tri, colmap,
+            payload.get("numero_ata"), payload.get("data_reuniao"),
+            payload.get("horario_inicio"), payload.get("horario_fim"),
+            payload.get("presidente"), payload.get("participantes"),
+            payload.get("ano"), payload.get("turma"), payload.get("turno"), payload.get("trimestre"))
+        texto = _texto_de_secoes(secoes)
+    draft = {"token": token, "texto": texto,
+             "params": _draft_params(payload), "version": version, "created_at": time.time()}
+    with _draft_lock:
+        _draft_cache[token] = draft
+        while len(_draft_cache) > DRAFT_CACHE_SIZE:
+            _draft_cache.popitem(last=False)
+    return draft
+
+def draft_cache_stats() -> dict:
+    with _draft_lock:
+        total = _draft_stats["hits"] + _draft_stats["misses"]
+        return {**_draft_stats, "entries": len(_draft_cache),
+                "hit_ratio": (_draft_stats["hits"] / total) if total else 0.0}
+
 # ---------- PDF ----------
+# reportlab só é importado no primeiro PDF; os estilos são construídos junto,
+# uma vez (somente leitura durante o build; seguros entre threads)
+_pdf_lib_ref = None
+_pdf_lib_lock = threading.Lock()
+
+def _pdf_lib() -> SimpleNamespace:
+    global _pdf_lib_ref
+    if _pdf_lib_ref is not None:
+        return _pdf_lib_ref
+    with _pdf_lib_lock:
+        if _pdf_lib_ref is None:
+            t0 = time.perf_counter()
+            from reportlab.lib.pagesizes import A4
+            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Flowable
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.lib.units import inch
+            from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+            sheet = getSampleStyleSheet()
+            normal = ParagraphStyle('NormalStyle', parent=sheet['Normal'], fontSize=10, alignment=TA_JUSTIFY, leading=14, spaceAfter=8)
+            _pdf_lib_ref = SimpleNamespace(
+                A4=A4, inch=inch, SimpleDocTemplate=SimpleDocTemplate, Paragraph=Paragraph, Spacer=Spacer,
+                HEADER_STYLE=ParagraphStyle('HeaderStyle', parent=sheet['Normal'], fontSize=11, alignment=TA_CENTER, spaceAfter=4),
+                TITLE_STYLE=ParagraphStyle('TitleStyle',  parent=sheet['Normal'], fontSize=12, alignment=TA_CENTER, spaceAfter=10, fontName='Helvetica-Bold'),
+                NORMAL_STYLE=normal,
+                CorpoCorrido=_classe_corpo_corrido(Flowable),
+            )
+            _lazy_import_seconds.setdefault("reportlab", round(time.perf_counter() - t0, 4))
+    return _pdf_lib_ref
+
 def create_pdf(data: pd.DataFrame, numero_ata, data_reuniao, horario_inicio, horario_fim,
                presidente, participantes, ano, turma, turno, trimestre, override_text=None,
                df_base_tri: pd.DataFrame=None, column_map: dict=None):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    styles = getSampleStyleSheet()
-    header_style = ParagraphStyle('HeaderStyle', parent=styles['Normal'], fontSize=11, alignment=TA_CENTER, spaceAfter=4)
-    title_style  = ParagraphStyle('TitleStyle',  parent=styles['Normal'], fontSize=12, alignment=TA_CENTER, spaceAfter=10, fontName='Helvetica-Bold')
-    normal_style = ParagraphStyle('NormalStyle', parent=styles['Normal'], fontSize=10, alignment=TA_JUSTIFY, leading=14, spaceAfter=8)
-
-    story=[]
-    story.append(Paragraph("PREFEITURA MUNICIPAL DE CURITIBA", header_style))
-    story.append(Paragraph("SECRETARIA MUNICIPAL DA EDUCAÇÃO", header_style))
-    story.append(Paragraph("ESCOLA MUNICIPAL MIRAZINHA BRAGA", header_style))
-    story.append(Spacer(1, 6))
-
-    ano_num = normaliza_ano_num(ano)
-    tri_label = rotulo_trimestre(trimestre)
-    turno_fmt = str(turno).strip().capitalize()
-    titulo = f"Conselho de Classe do {ordinal_masc(ano_num)} ano {turma} - {turno_fmt} - {tri_label}"
-    story.append(Paragraph(titulo, title_style))
-
-    participantes_lista = [p for p in str(participantes).split("\n") if p.strip()]
     if override_text and override_text.strip():
         texto = override_text.strip()
     else:
@@ -390,22 +1279,275 @@ def create_pdf(data: pd.DataFrame, numero_ata, data_reuniao, horario_inicio, hor
             presidente=presidente, participantes=participantes,
             ano=ano, turma=turma, turno=turno, trimestre=trimestre
         )
+    return io.BytesIO(render_pdf_bytes(texto, presidente, participantes, ano, turma, turno, trimestre))
+
+def _titulo_pdf(ano, turma, turno, trimestre) -> str:
+    ano_num = normaliza_ano_num(ano)
+    tri_label = rotulo_trimestre(trimestre)
+    turno_fmt = str(turno).strip().capitalize()
+    return f"Conselho de Classe do {ordinal_masc(ano_num)} ano {turma} - {turno_fmt} - {tri_label}"
+
+def _lista_participantes(participantes) -> list[str]:
+    return [p for p in str(participantes).split("\n") if p.strip()]
+
+def _classe_corpo_corrido(Flowable):
+    """
+    O corpo da ata é um parágrafo corrido só. O Paragraph do reportlab, ao
+    passar de página, devolve o restante como outro Paragraph e re-quebra todas
+    as linhas que sobraram: custo quadrático no tamanho da turma. Este flowable
+    quebra as linhas uma vez; cada página recebe um Paragraph com o seu trecho
+    (mesma quebra e mesma justificação do parágrafo inteiro).
+    """
+    class CorpoCorrido(Flowable):
+        def __init__(self, para, inicio=0):
+            super().__init__()
+            self.para = para
+            self.style = para.style  # espaçamentos e keepWithNext do estilo
+            self.inicio = inicio
+
+        def _linhas(self, aW):
+            para = self.para
+            if getattr(para, "_largura", None) != aW:
+                para.wrap(aW, 0x7fffffff)
+                para._largura = aW
+            return para.blPara.lines
+
+        def _trecho(self, inicio, fim, justifica_ultima):
+            para = self.para
+            func = para._get_split_blParaFunc()
+            trecho = type(para)(None, para.style, frags=func(para.blPara, inicio, fim))
+            trecho._JustifyLast = justifica_ultima
+            return trecho
+
+        def wrap(self, aW, aH):
+            self.width = aW
+            self.height = (len(self._linhas(aW)) - self.inicio) * self.style.leading
+            return aW, self.height
+
+        def split(self, aW, aH):
+            linhas = self._linhas(aW)
+            cabem = int(aH / float(self.style.leading))
+            if cabem <= 1:  # sem linha órfã no pé da página, como o Paragraph
+                return []
+            fim = self.inicio + cabem
+            if fim >= len(linhas):
+                return [self]
+            # quebra forçada (<br/>) não justifica a linha, como no split do Paragraph
+            quebra = getattr(linhas[fim - 1], "lineBreak", False)
+            return [self._trecho(self.inicio, fim, not quebra), CorpoCorrido(self.para, fim)]
+
+        def draw(self):
+            trecho = self._trecho(self.inicio, len(self._linhas(self.width)), False)
+            trecho.wrap(self.width, self.height)
+            trecho.drawOn(self.canv, 0, 0)
+
+    return CorpoCorrido
+
+def _corpo_flowables(texto: str) -> list:
+    rl = _pdf_lib()
+    return [rl.CorpoCorrido(rl.Paragraph(texto.replace("\n", "<br/>"), rl.NORMAL_STYLE))]
+
+def _build_pdf(texto, presidente, participantes, ano, turma, turno, trimestre) -> bytes:
+    """
+    Monta o PDF de um texto já composto (sem cache). Função de topo: roda no process pool.
+    """
+    rl = _pdf_lib()
+    Paragraph, Spacer, NORMAL_STYLE = rl.Paragraph, rl.Spacer, rl.NORMAL_STYLE
+    buffer = io.BytesIO()
+    doc = rl.SimpleDocTemplate(buffer, pagesize=rl.A4, topMargin=0.5*rl.inch, bottomMargin=0.5*rl.inch)
+
+    story=[]
+    story.append(Paragraph("PREFEITURA MUNICIPAL DE CURITIBA", rl.HEADER_STYLE))
+    story.append(Paragraph("SECRETARIA MUNICIPAL DA EDUCAÇÃO", rl.HEADER_STYLE))
+    story.append(Paragraph("ESCOLA MUNICIPAL MIRAZINHA BRAGA", rl.HEADER_STYLE))
+    story.append(Spacer(1, 6))
+    story.append(Paragraph(_titulo_pdf(ano, turma, turno, trimestre), rl.TITLE_STYLE))
 
-    story.append(Paragraph(texto.replace("\n","<br/>"), normal_style))
+    story.extend(_corpo_flowables(texto))
     story.append(Spacer(1, 10))
-    story.append(Paragraph("<b>ASSINATURAS:</b>", normal_style))
+    story.append(Paragraph("<b>ASSINATURAS:</b>", NORMAL_STYLE))
     story.append(Spacer(1, 6))
-    story.append(Paragraph("_________________________________", normal_style))
-    story.append(Paragraph(f"{presidente} — Presidente(a) do Conselho", normal_style))
+    story.append(Paragraph("_________________________________", NORMAL_STYLE))
+    story.append(Paragraph(f"{presidente} — Presidente(a) do Conselho", NORMAL_STYLE))
     story.append(Spacer(1, 6))
-    for participante in participantes_lista:
-        story.append(Paragraph("_________________________________", normal_style))
-        story.append(Paragraph(participante, normal_style))
+    for participante in _lista_participantes(participantes):
+        story.append(Paragraph("_________________________________", NORMAL_STYLE))
+        story.append(Paragraph(participante, NORMAL_STYLE))
         story.append(Spacer(1, 6))
 
     doc.build(story)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
+
+# ---------- CACHE DE PDF ----------
+# Endereçado pelo conteúdo (texto final + participantes + presidente + cabeçalho);
+# LRU limitado em bytes por PDF_CACHE_MAX_BYTES (0 desliga).
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+_pdf_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+_pdf_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+
+def pdf_cache_key(texto, presidente, participantes, ano, turma, turno, trimestre) -> str:
+    # chave sobre o que de fato vai para o documento (título já normalizado)
+    conteudo = [str(texto), str(presidente), _lista_participantes(participantes),
+                _titulo_pdf(ano, turma, turno, trimestre)]
+    return hashlib.sha256(json.dumps(conteudo, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def pdf_cache_get(key: str) -> bytes | None:
+    with _pdf_cache_lock:
+        pdf = _pdf_cache.get(key)
+        if pdf is None:
+            _pdf_cache_stats["misses"] += 1
+            return None
+        _pdf_cache.move_to_end(key)
+        _pdf_cache_stats["hits"] += 1
+        return pdf
+
+def pdf_cache_put(key: str, pdf: bytes) -> None:
+    if len(pdf) > PDF_CACHE_MAX_BYTES:
+        return
+    with _pdf_cache_lock:
+        old = _pdf_cache.pop(key, None)
+        if old is not None:
+            _pdf_cache_stats["bytes"] -= len(old)
+        _pdf_cache[key] = pdf
+        _pdf_cache_stats["bytes"] += len(pdf)
+        while _pdf_cache_stats["bytes"] > PDF_CACHE_MAX_BYTES:
+            _, evicted = _pdf_cache.popitem(last=False)
+            _pdf_cache_stats["bytes"] -= len(evicted)
+            _pdf_cache_stats["evictions"] += 1
+
+def pdf_cache_stats() -> dict:
+    with _pdf_cache_lock:
+        total = _pdf_cache_stats["hits"] + _pdf_cache_stats["misses"]
+        return {
+            **_pdf_cache_stats,
+            "entries": len(_pdf_cache),
+            "max_bytes": PDF_CACHE_MAX_BYTES,
+            "hit_ratio": (_pdf_cache_stats["hits"] / total) if total else 0.0,
+        }
+
+def render_pdf_bytes(texto, presidente, participantes, ano, turma, turno, trimestre, pool=None) -> bytes:
+    """
+    PDF de um texto já composto, passando pelo cache. Em caso de miss, monta
+    no process pool (se informado) ou no próprio processo.
+    """
+    args = (texto, presidente, participantes, ano, turma, turno, trimestre)
+    key = pdf_cache_key(*args)
+    pdf = pdf_cache_get(key)
+    if pdf is None:
+        with stage("render"):
+            pdf = pool.submit(_build_pdf, *args).result() if pool is not None else _build_pdf(*args)
+        pdf_cache_put(key, pdf)
+    return pdf
+
+# ---------- LOTE (várias turmas) ----------
+# reportlab é CPU-bound e segura o GIL: o lote renderiza em processos separados.
+# PDF_PROCESS_WORKERS=0 renderiza no próprio processo, em sequência.
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool() -> ProcessPoolExecutor | None:
+    global _process_pool
+    if PDF_PROCESS_WORKERS <= 0:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: o servidor tem threads; fork herdaria locks em estado indefinido
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PDF_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+def _warm_worker(_=None) -> int:
+    _pdf_lib()
+    return os.getpid()
+
+def warm_pdf() -> None:
+    """Importa o reportlab aqui e sobe os workers do process pool já com ele carregado."""
+    _pdf_lib()
+    pool = get_process_pool()
+    if pool is not None:
+        list(pool.map(_warm_worker, range(PDF_PROCESS_WORKERS)))
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def split_turmas(df_base_tri: pd.DataFrame, ano=None, turno=None) -> list[tuple[str, str, str, pd.DataFrame]]:
+    """
+    Divide o DF do trimestre em [(ano, turno, turma, df_turma)], opcionalmente restrito
+    a um ano/turno. Agrupa com a mesma normalização do filtro (strip + casefold).
+    Linhas do turno "Integral" não viram turma: entram nas atas pelo mapa do Integral.
+    """
+    df = _filter_df(df_base_tri, ano=ano, turno=turno)
+    if not isinstance(df, pd.DataFrame) or df.empty or not {"ano", "turno", "turma"} <= set(df.columns):
+        return []
+    df = df[df["turno"].astype(str).str.strip().str.casefold() != "integral"]
+    if df.empty:
+        return []
+    labels = {k: df[k].astype(str).str.strip() for k in ("ano", "turno", "turma")}
+    keys = [labels[k].str.casefold() for k in ("ano", "turno", "turma")]
+    out = []
+    for _, idx in sorted(df.groupby(keys, sort=False).indices.items(),
+                         key=lambda kv: tuple(_natural_key(x) for x in kv[0])):
+        first = idx[0]
+        out.append((labels["ano"].iat[first], labels["turno"].iat[first], labels["turma"].iat[first],
+                    df.iloc[idx]))
+    return out
+
+def _natural_key(val: str):
+    m = re.match(r"\d+", val)
+    return (0, int(m.group()), val) if m else (1, 0, val)
+
+def gerar_atas_lote(df_base_tri, column_map, trimestre, numero_ata, data_reuniao, horario_inicio,
+                    horario_fim, presidente, participantes, ano=None, turno=None, on_progress=None) -> list[dict]:
+    """
+    Compõe e renderiza as atas de todas as turmas do trimestre (ou de um ano/turno).
+    numero_ata numérico é incrementado a cada turma. Retorna
+    [{"ano", "turno", "turma", "numero_ata", "pdf": bytes}] na ordem das turmas.
+    on_progress(prontas, total) é chamado a cada PDF pronto (e uma vez após o cache).
+    """
+    turmas = split_turmas(df_base_tri, ano=ano, turno=turno)
+    try:
+        numeros = [str(int(str(numero_ata).strip()) + i) for i in range(len(turmas))]
+    except (TypeError, ValueError):
+        numeros = [numero_ata] * len(turmas)
+
+    jobs = []
+    for (t_ano, t_turno, t_turma, df_turma), num in zip(turmas, numeros):
+        texto = compose_text_core(
+            df_filt=df_turma, df_base_tri=df_base_tri, column_map=column_map,
+            numero_ata=num, data_reuniao=data_reuniao,
+            horario_inicio=horario_inicio, horario_fim=horario_fim,
+            presidente=presidente, participantes=participantes,
+            ano=t_ano, turma=t_turma, turno=t_turno, trimestre=trimestre,
+        )
+        jobs.append(({"ano": t_ano, "turno": t_turno, "turma": t_turma, "numero_ata": num},
+                     (texto, presidente, participantes, t_ano, t_turma, t_turno, trimestre)))
+
+    # cache primeiro; só os misses vão para o process pool
+    keys = [pdf_cache_key(*args) for _, args in jobs]
+    pdfs = [pdf_cache_get(k) for k in keys]
+    misses = [i for i, pdf in enumerate(pdfs) if pdf is None]
+    pool = get_process_pool() if len(misses) > 1 else None
+    done = len(jobs) - len(misses)
+    if on_progress is not None:
+        on_progress(done, len(jobs))
+    with stage("render"):
+        if pool is None:
+            built = (_build_pdf(*jobs[i][1]) for i in misses)
+        else:
+            built = pool.map(_build_pdf, *zip(*(jobs[i][1] for i in misses)))
+        for i, pdf in zip(misses, built):
+            pdf_cache_put(keys[i], pdf)
+            pdfs[i] = pdf
+            done += 1
+            if on_progress is not None:
+                on_progress(done, len(jobs))
+    return [{**meta, "pdf": pdf} for (meta, _), pdf in zip(jobs, pdfs)]
 
 # ---------- SELF CHECK ----------
 def core_self_check(root_dir: Path):
@@ -443,21 +1585,16 @@ def core_self_check(root_dir: Path):
 # ---------- DATAFRAME UTIL ----------
 
 def load_all_df() -> pd.DataFrame:
-    """Carrega todo o dataset (Supabase se disponível; caso contrário, Excel local)."""
+    """Carrega todo o dataset (Supabase se disponível; caso contrário, Excel local), via cache."""
     try:
-        if _env_has_supabase():
-            df = fetch_supabase_df(ano=None, turno=None, turma=None, trimestre=None)
-        else:
-            # usa o mesmo fallback local do get_df_for_filters
-            df = fetch_local_df(None, None, None, None)
-        return df if isinstance(df, pd.DataFrame) else pd.DataFrame()
+        return get_dataset()
     except Exception:
         return pd.DataFrame()
 
 def _distinct_sorted(series) -> list:
     vals = (
         series.astype(str)
-        .map(lambda s: s.strip())
+        .map(lambda s: s.strip(), na_action="ignore")  # célula vazia: NaN mesmo após astype(str)
         .replace({"": None})
         .dropna()
         .unique()
@@ -470,47 +1607,144 @@ def _distinct_sorted(series) -> list:
     except Exception:
         return sorted(vals, key=lambda x: x.casefold())
 
+# ---------- ÍNDICE DE FACETAS ----------
+# Índice hierárquico ano → turno → turma → trimestre, construído uma vez por versão
+# do dataset. /options e /health passam a ser consultas de dicionário.
+_FACET_KEYS = ("ano", "turno", "turma", "trimestre")
+_facet_cache = {"version": None, "index": None}
+
+def _facet_lookup_key(val) -> str | None:
+    return str(val).strip().casefold() if val else None
+
+def build_facet_index(df: pd.DataFrame) -> dict:
+    """
+    Reduz o DF às combinações distintas das chaves (com contagem de linhas) e
+    pré-calcula as respostas de get_global_options/get_dependent_options/get_counts_summary.
+    """
+    empty = {
+        "rows": 0, "tree": {},
+        "global": {"anos": [], "turnos": []},
+        "dependent": {},
+        "counts": {"anos": 0, "turnos": 0, "turmas": 0, "trimestres": 0},
+    }
+    if not isinstance(df, pd.DataFrame) or df.empty:
+        return empty
+
+    present = [k for k in _FACET_KEYS if COLUMN_MAP[k] in df.columns]
+    if not present:
+        return {**empty, "rows": int(len(df))}
+    combos = (
+        df[[COLUMN_MAP[k] for k in present]].set_axis(present, axis=1)
+        .groupby(present, dropna=False, sort=False).size()
+        .rename("count").reset_index()
+    )
+    for k in _FACET_KEYS:
+        if k not in present:
+            combos[k] = pd.Series(dtype=object, index=combos.index)
+
+    def _col(frame, k):
+        return frame[k] if k in present else pd.Series(dtype=str)
+
+    # chaves de busca: mesma normalização do filtro antigo (coluna sem strip, valor com strip)
+    ano_cf = combos["ano"].astype(str).str.casefold()
+    turno_cf = combos["turno"].astype(str).str.casefold()
+
+    dependent = {}
+    for a in [None, *ano_cf.dropna().unique().tolist()]:
+        for t in [None, *turno_cf.dropna().unique().tolist()]:
+            mask = pd.Series(True, index=combos.index)
+            if a is not None:
+                mask &= ano_cf == a
+            if t is not None:
+                mask &= turno_cf == t
+            sub = combos[mask]
+            if sub.empty:
+                continue
+            turmas = _distinct_sorted(_col(sub, "turma"))
+            trimestres = _distinct_sorted(_col(sub, "trimestre"))
+            try:
+                trimestres = sorted({int(str(x)) for x in trimestres})
+            except Exception:
+                pass
+            dependent[(a, t)] = {"turmas": turmas, "trimestres": trimestres}
+
+    # árvore com filhos ordenados e contagem de linhas em cada nível
+    tree = {}
+    for row in combos.itertuples(index=False):
+        node, path = tree, [getattr(row, k) for k in _FACET_KEYS]
+        for depth, val in enumerate(path):
+            label = "" if pd.isna(val) else str(val).strip()
+            child = node.setdefault(label, {"count": 0, "children": {}})
+            child["count"] += int(row.count)
+            node = child["children"]
+
+    def _sort_tree(node):
+        labels = _distinct_sorted(pd.Series(list(node.keys()), dtype=object)) if node else []
+        rest = [k for k in node if k not in labels]
+        return {k: {"count": node[k]["count"], "children": _sort_tree(node[k]["children"])}
+                for k in labels + rest}
+
+    return {
+        "rows": int(combos["count"].sum()),
+        "tree": _sort_tree(tree),
+        "global": {
+            "anos": _distinct_sorted(_col(combos, "ano")),
+            "turnos": _distinct_sorted(_col(combos, "turno")),
+        },
+        "dependent": dependent,
+        "counts": {
+            "anos": _col(combos, "ano").astype(str).str.strip().nunique(),
+            "turnos": _col(combos, "turno").astype(str).str.strip().nunique(),
+            "turmas": _col(combos, "turma").astype(str).str.strip().nunique(),
+            "trimestres": _col(combos, "trimestre").astype(str).str.strip().nunique(),
+        },
+    }
+
+def get_facet_index() -> dict:
+    """Índice de facetas da versão atual do dataset (reconstruído só quando ela muda)."""
+    try:
+        df, version = get_dataset_versioned()
+    except Exception:
+        df, version = pd.DataFrame(), None
+    with _dataset_lock:
+        cached = _facet_cache["index"]
+        if cached is not None and version is not None and _facet_cache["version"] == version:
+            return cached
+    index = build_facet_index(df)
+    if version is not None:
+        with _dataset_lock:
+            _facet_cache.update({"version": version, "index": index})
+    return index
+
 def get_global_options() -> dict:
     """
     Retorna anos e turnos globais (para popular selects iniciais).
     """
-    df = load_all_df()
-    if df.empty:
-        return {"anos": [], "turnos": []}
-    anos = _distinct_sorted(df.get(COLUMN_MAP["ano"], pd.Series(dtype=str)))
-    turnos = _distinct_sorted(df.get(COLUMN_MAP["turno"], pd.Series(dtype=str)))
-    return {"anos": anos, "turnos": turnos}
+    g = get_facet_index()["global"]
+    return {"anos": list(g["anos"]), "turnos": list(g["turnos"])}
 
 def get_dependent_options(ano: str | None, turno: str | None) -> dict:
     """
     Dado ano/turno, retorna turmas e trimestres disponíveis.
     """
-    df = load_all_df()
-    if df.empty:
+    found = get_facet_index()["dependent"].get((_facet_lookup_key(ano), _facet_lookup_key(turno)))
+    if not found:
         return {"turmas": [], "trimestres": []}
-    if ano:
-        df = df[df[COLUMN_MAP["ano"]].astype(str).str.casefold()==str(ano).strip().casefold()]
-    if turno:
-        df = df[df[COLUMN_MAP["turno"]].astype(str).str.casefold()==str(turno).strip().casefold()]
-    turmas = _distinct_sorted(df.get(COLUMN_MAP["turma"], pd.Series(dtype=str)))
-    trimestres = _distinct_sorted(df.get(COLUMN_MAP["trimestre"], pd.Series(dtype=str)))
-    # normaliza trimestres como inteiros quando possível
-    try:
-        trimestres = sorted({int(str(x)) for x in trimestres})
-    except Exception:
-        pass
-    return {"turmas": turmas, "trimestres": trimestres}
+    return {"turmas": list(found["turmas"]), "trimestres": list(found["trimestres"])}
+
+def get_facet_tree() -> dict:
+    """Árvore ano → turno → turma → trimestre com contagem de linhas."""
+    return get_facet_index()["tree"]
 
 def get_counts_summary() -> dict:
     """
     Resume contagens distintas (anos, turnos, turmas, trimestres) para /api/health.
     """
-    df = load_all_df()
-    if df.empty:
-        return {"anos": 0, "turnos": 0, "turmas": 0, "trimestres": 0}
-    return {
-        "anos": df[COLUMN_MAP["ano"]].astype(str).str.strip().nunique() if COLUMN_MAP["ano"] in df else 0,
-        "turnos": df[COLUMN_MAP["turno"]].astype(str).str.strip().nunique() if COLUMN_MAP["turno"] in df else 0,
-        "turmas": df[COLUMN_MAP["turma"]].astype(str).str.strip().nunique() if COLUMN_MAP["turma"] in df else 0,
-        "trimestres": df[COLUMN_MAP["trimestre"]].astype(str).str.strip().nunique() if COLUMN_MAP["trimestre"] in df else 0,
-    }
+    return dict(get_facet_index()["counts"])
+
+# ---------- COLD START ----------
+IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_T0, 4)  # import deste módulo (inclui pandas, se ainda não carregado)
+
+def startup_stats() -> dict:
+    return {"core_import_s": IMPORT_SECONDS, "lazy_imports_s": dict(_lazy_import_seconds),
+            "reportlab_loaded": _pdf_lib_ref is not None, "supabase_loaded": _supabase_client is not None}
@@ -1,104 +1,179 @@
 # api/index.py — Render-ready
-import os, sys, zipfile, smtplib, ssl, io
-import json, base64, http.client, mimetypes
+import time
+_T0 = time.perf_counter()  # relatório de cold start (ver /startup)
+import os, sys, asyncio, threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from email.message import EmailMessage
-from typing import List, Tuple
 from fastapi import FastAPI, APIRouter, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-import socket, errno
+from fastapi.responses import Response, StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.middleware.gzip import GZipMiddleware, DEFAULT_EXCLUDED_CONTENT_TYPES
+from email.utils import formatdate, parsedate_to_datetime
+import zlib, re, json, hashlib, uuid
 # garante import local
 here = Path(__file__).resolve().parent
 if str(here) not in sys.path:
     sys.path.insert(0, str(here))
 
-app = FastAPI(title="GeraAta API")
+@asynccontextmanager
+async def _lifespan(app):
+    # startup: aquecimento opcional (ver PREWARM); shutdown: drena e-mails e o process pool
+    STARTUP["started_at"] = time.time()
+    steps = _prewarm_steps()
+    if steps and PREWARM_WAIT:
+        await run_in_threadpool(_prewarm, steps)
+    elif steps:
+        threading.Thread(target=_prewarm, args=(steps,), name="prewarm", daemon=True).start()
+    yield
+    OUTBOX.stop(timeout=5)
+    core = _core_loaded()
+    if core is not None:
+        core.shutdown_process_pool()
+
+app = FastAPI(title="GeraAta API", lifespan=_lifespan)
 
 # --- Infra local para fila/arquivos -----------------------------------------
 DATA_DIR = Path(os.getenv("DATA_DIR", here))  # mesmo dir por padrão
 OUT_DIR  = DATA_DIR / "out"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
-ZIP_PATH = OUT_DIR / "atas.zip"
-
-# Estrutura simples de fila na memória:
-# Cada item: {"filename": str, "path": Path, "size": int}
-QUEUE: list[dict] = []
+ZIP_NAME = "atas.zip"  # gerado em streaming por /download_zip, nunca gravado em disco
+
+from jobs import JobManager, PENDING, RUNNING, CURRENT_JOB
+from zipstream import ZipPlan, parse_range
+from queue_store import make_store
+from outbox import make_outbox, max_attachment_bytes, PENDING as OUTBOX_PENDING
+from zipstream import split_entries
+from admission import AdmissionLimiter, Overloaded
+from events import EventBus, format_sse
+import metrics
+
+# Fila por sessão (SQLite/WAL em DATA_DIR por padrão; ver QUEUE_STORE).
+# Cada item: {"filename": str, "path": str, "size": int, "crc32": int, "mtime": float}
+STORE = make_store(DATA_DIR)
+
+# Eventos por sessão (fila, jobs, progresso) para o stream SSE em /events
+EVENTS = EventBus()
+
+def _on_job(job: dict):
+    if job.get("session") and EVENTS.has_subscribers(job["session"]):
+        EVENTS.publish(job["session"], "job", job)
+
+# Jobs de renderização em background (pool limitado, ver RENDER_WORKERS)
+JOBS = JobManager(store=STORE, listener=_on_job)
+
+# Admissão nas rotas que leem dados e renderizam (/compose_text, /queue_ata, /queue_batch):
+# vagas limitadas, fila de espera curta e justa por cliente; excedente -> 429 + Retry-After
+ADMISSION = AdmissionLimiter()
+
+# Caixa de saída de e-mails (mesmo SQLite da fila); retoma pendentes de um restart
+OUTBOX = make_outbox(DATA_DIR)
+if OUTBOX.store.counts()[OUTBOX_PENDING]:
+    OUTBOX.start()
+
+# Sessão: header X-Session-Id (ou ?sid=, para links de download); sem ela, "default"
+SESSION_HEADER = "X-Session-Id"
+
+def _session_id(req: Request) -> str:
+    raw = req.headers.get(SESSION_HEADER) or req.query_params.get("sid") or ""
+    return re.sub(r"[^A-Za-z0-9_-]", "", raw)[:64] or "default"
+
+def _session_out_dir(session: str) -> Path:
+    d = OUT_DIR / session
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def _zip_name(session: str) -> str:
+    return ZIP_NAME if session == "default" else f"atas_{session[:8]}.zip"
+
+def _client_key(req: Request) -> str:
+    # justiça da fila de admissão: por sessão; sem ela, pelo IP de origem (atrás do proxy)
+    session = _session_id(req)
+    if session != "default":
+        return f"sid:{session}"
+    fwd = req.headers.get("x-forwarded-for", "").split(",")[0].strip()
+    return f"ip:{fwd or (req.client.host if req.client else '?')}"
+
+@asynccontextmanager
+async def _admitted(req: Request):
+    admitted_at = await ADMISSION.acquire(_client_key(req))
+    try:
+        yield
+    finally:
+        ADMISSION.release(admitted_at)
 
 def _safe_int(x, default=0):
     try: return int(x)
     except: return default
 
-def _queue_snapshot() -> list[dict]:
-    snap=[]
-    for it in QUEUE:
-        p = Path(it["path"])
-        snap.append({
-            "filename": it.get("filename") or p.name,
-            "size": it.get("size") or (p.stat().st_size if p.exists() else 0),
-        })
-    return snap
-
-
-def _send_email_with_attachment(
-    subject: str,
-    body: str,
-    to_addrs: List[str],
-    attach_path: Path,
-    cc_addrs: List[str] | None = None,
-) -> Tuple[bool, str]:
-    host = os.getenv("SMTP_HOST")
-    port = _safe_int(os.getenv("SMTP_PORT", 587), 587)
-    user = os.getenv("SMTP_USER")
-    pwd  = os.getenv("SMTP_PASS")
-    tls  = os.getenv("SMTP_TLS", "1") not in ("0", "false", "False")
-
-    if not host or not user or not pwd:
-        return False, "Variáveis SMTP_HOST/SMTP_USER/SMTP_PASS não configuradas."
-
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"]    = os.getenv("SMTP_FROM") or user
-    msg["To"]      = ", ".join(to_addrs or [])
-    if cc_addrs:
-        msg["Cc"]  = ", ".join(cc_addrs)
-    msg.set_content(body or "")
-
-    if not (attach_path and attach_path.exists()):
-        return False, "Anexo não encontrado para envio."
-    data = attach_path.read_bytes()
-    msg.add_attachment(data, maintype="application", subtype="zip", filename=attach_path.name)
-
-    # --- resolve e tenta cada endereço (v6/v4) com timeout curto ---
-    last_err = None
+def _ata_filename(numero_ata, ano, turma, turno, trimestre) -> str:
+    # Nome do arquivo padrão (com sanitização básica)
+    numero = str(numero_ata or "s-n").replace("/", "-").replace(":", "-")
+    ano, turma, turno, tri = (str(x or "").strip() for x in (ano, turma, turno, trimestre))
+    return f"ATA_{numero}_{ano}_{turma}_{turno}_{tri}.pdf".replace(" ", "")
+
+def _enqueue_pdf(session: str, fname: str, pdf: bytes, publish: bool = True) -> dict:
+    """Grava o PDF na pasta da sessão e o coloca na fila (com CRC/tamanho para o ZIP em streaming)."""
+    fpath = _session_out_dir(session) / fname
+    with metrics.stage("write"):
+        # arquivo novo + rename: quem ainda tem o antigo aberto (ou um hardlink da
+        # caixa de saída) continua vendo os bytes de antes
+        tmp = fpath.with_name(f".{fpath.name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_bytes(pdf)
+        os.replace(tmp, fpath)
+    item = {"filename": fpath.name, "path": str(fpath), "size": len(pdf),
+            "crc32": zlib.crc32(pdf), "mtime": fpath.stat().st_mtime}
+    item = STORE.append(session, item)
+    if publish:
+        _publish_queue(session)
+    return item
+
+def _zip_plan(session: str) -> ZipPlan:
+    with metrics.stage("zip"):
+        return ZipPlan([{**it, "arcname": it.get("filename")} for it in STORE.items(session)])
+
+def _timed_stream(chunks, name: str = "zip", on_sent=None):
+    """Repassa os chunks medindo só o tempo gasto para produzi-los (não o envio ao cliente)."""
+    spent = 0.0
     try:
-        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP)
-    except Exception as e:
-        return False, f"Falha DNS/resolve para {host}: {e}"
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(chunks, None)
+            spent += time.perf_counter() - t0
+            if chunk is None:
+                return
+            yield chunk
+            if on_sent is not None:
+                on_sent(len(chunk))
+    finally:
+        metrics.observe_stage(name, spent)
+
+def _queue_snapshot(session: str) -> list[dict]:
+    # tamanho gravado no enfileiramento: nenhum stat() por item
+    return [{"filename": it.get("filename") or Path(it["path"]).name, "size": it.get("size") or 0}
+            for it in STORE.items(session)]
+
+def _publish_queue(session: str):
+    if EVENTS.has_subscribers(session):
+        EVENTS.publish(session, "queue", {"queue": _queue_snapshot(session)})
+
+def _progress(session: str, **data):
+    if EVENTS.has_subscribers(session):
+        EVENTS.publish(session, "progress", {"job": CURRENT_JOB.get(), **data})
+
+def _zip_progress(session: str, total: int):
+    # bytes do ZIP já entregues, no máximo a cada 0,5 s (e no fim)
+    if not EVENTS.has_subscribers(session):
+        return None
+    state = {"sent": 0, "t": 0.0}
+    def _on_sent(n: int):
+        state["sent"] += n
+        now = time.monotonic()
+        if now - state["t"] >= 0.5 or state["sent"] >= total:
+            state["t"] = now
+            _progress(session, stage="zip", sent=state["sent"], total=total)
+    return _on_sent
 
-    for family, socktype, proto, canonname, sockaddr in infos:
-        ip = sockaddr[0]
-        try:
-            # timeout total por tentativa (ajuste se quiser)
-            with smtplib.SMTP(timeout=20) as server:
-                # conecta no IP específico (força v4 quando ip é A-record)
-                server.connect(ip, port)
-                if tls:
-                    context = ssl.create_default_context()
-                    server.starttls(context=context)
-                server.login(user, pwd)
-                server.send_message(msg)
-            return True, "E-mail enviado."
-        except OSError as e:
-            last_err = e
-            # ENETUNREACH: “Network is unreachable” -> tenta o próximo IP
-            if isinstance(e, OSError) and getattr(e, "errno", None) == errno.ENETUNREACH:
-                continue
-        except Exception as e:
-            last_err = e
-
-    # se chegou aqui, todas as tentativas falharam
-    return False, f"Falha no envio (rede/SMTP): {host}:{port} — último erro: {last_err}"
 
 # 1) CORS: ajuste para o domínio REAL do seu front
 FRONTEND_ORIGIN = "https://geraata-1.onrender.com"
@@ -108,200 +183,407 @@ app.add_middleware(
     allow_origins=[FRONTEND_ORIGIN],   # sem barra no origin!
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],  # o front respeita o 429 do controle de admissão
     # se em algum momento você usar fetch com credenciais: credentials: 'include'
     # ative isto ↓ e mantenha allow_origins específico (não "*")
     # allow_credentials=True,
 )
 
+# Compressão de JSON/texto grandes. ZIP, PDF, SSE e respostas 206 (Range) passam
+# direto: já comprimidos ou precisam do Content-Length/offsets originais.
+# exclude_content_types e o desvio dos 206 exigem starlette>=1.5 (requirements.txt).
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL,
+                   exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/pdf",))
+
 # 2) Prefixo configurável: no Render use /api/index para casar com o front
 API_PREFIX = os.getenv("API_PREFIX", "/api/index")
 api = APIRouter(prefix=API_PREFIX)
 
+# 3) Métricas: latência por rota + Server-Timing (ver metrics.py e /metrics)
+def _route_label(scope) -> str:
+    # template da rota (ex.: /api/index/job_status), nunca o path cru: cardinalidade fixa
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    endpoint = scope.get("endpoint")
+    for r in app.routes:
+        if getattr(r, "endpoint", None) is endpoint and endpoint is not None:
+            return r.path
+    return "unmatched"
+
+app.add_middleware(metrics.MetricsMiddleware, route_label=_route_label)
+
+@app.exception_handler(Overloaded)
+async def _overloaded(request: Request, exc: Overloaded):
+    return JSONResponse(
+        {"success": False, "error": "Servidor ocupado, tente novamente em instantes.",
+         "reason": exc.reason, "retry_after": exc.retry_after},
+        status_code=429, headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def _core_loaded():
+    # não força o import do core (e do pandas) só para um scrape
+    return sys.modules.get("gerar_ata_core")
+
+# 4) Cold start: o core só importa reportlab/supabase quando precisa; o lifespan
+# pode aquecer o resto. PREWARM lista as etapas, separadas por vírgula:
+# dataset, objetivos, participantes, pdf (reportlab + workers do process pool).
+# "1" = dataset,objetivos,participantes; "0" = nada, tudo sob demanda.
+# PREWARM_WAIT=1 segura o startup até terminar (o worker só atende já aquecido).
+PREWARM = os.getenv("PREWARM", "1")
+PREWARM_WAIT = os.getenv("PREWARM_WAIT", "0") == "1"
+STARTUP = {"started_at": None, "index_import_s": None, "prewarm": {}, "prewarm_total_s": None}
+
+def _prewarm_steps() -> list[str]:
+    raw = PREWARM.strip().lower()
+    if raw in ("", "0", "false", "no"):
+        return []
+    if raw in ("1", "true", "yes"):
+        return ["dataset", "objetivos", "participantes"]
+    return [p.strip() for p in raw.split(",") if p.strip()]
+
+def _prewarm(steps: list[str]) -> None:
+    t_all = time.perf_counter()
+    t0 = time.perf_counter()
+    import gerar_ata_core as core
+    STARTUP["prewarm"]["import_core"] = round(time.perf_counter() - t0, 4)
+    acoes = {"dataset": core.get_facet_index, "objetivos": core.carregar_objetivos,
+             "participantes": core.load_participantes_from_xlsx, "pdf": core.warm_pdf}
+    for step in steps:
+        fn = acoes.get(step)
+        if fn is None:
+            STARTUP["prewarm"][step] = "etapa desconhecida"
+            continue
+        t0 = time.perf_counter()
+        try:
+            fn()
+            STARTUP["prewarm"][step] = round(time.perf_counter() - t0, 4)
+        except Exception as e:  # sem dados ainda não impede o worker de subir
+            STARTUP["prewarm"][step] = f"erro: {type(e).__name__}: {e}"
+    STARTUP["prewarm_total_s"] = round(time.perf_counter() - t_all, 4)
+
+def startup_report() -> dict:
+    core = _core_loaded()
+    first = dict(metrics.FIRST_REQUEST)
+    if first:
+        first["after_import_s"] = round(first.pop("t") - _T0, 4)
+    return {"index_import_s": STARTUP["index_import_s"], "started_at": STARTUP["started_at"],
+            "core": core.startup_stats() if core is not None else {"loaded": False},
+            "prewarm": {"steps": _prewarm_steps(), "wait": PREWARM_WAIT, "timings_s": dict(STARTUP["prewarm"]),
+                        "total_s": STARTUP["prewarm_total_s"]},
+            "first_request": first or None}
+
+def _startup_samples():
+    rep = startup_report()
+    out = [({"phase": "index_import"}, rep["index_import_s"] or 0.0)]
+    if "core_import_s" in rep["core"]:
+        out.append(({"phase": "core_import"}, rep["core"]["core_import_s"]))
+        out += [({"phase": f"import_{k}"}, v) for k, v in rep["core"]["lazy_imports_s"].items()]
+    out += [({"phase": f"prewarm_{k}"}, v) for k, v in rep["prewarm"]["timings_s"].items() if isinstance(v, float)]
+    if rep["first_request"]:
+        out.append(({"phase": "first_request"}, rep["first_request"]["seconds"]))
+    return out
+
+def _cache_samples(field: str):
+    core = _core_loaded()
+    if core is None:
+        return []
+    stats = {"dataset": core.dataset_cache_stats(), "pdf": core.pdf_cache_stats(), "drafts": core.draft_cache_stats(),
+             "integral": core.integral_cache_stats()}
+    return [({"cache": name}, st[field]) for name, st in stats.items()]
+
+metrics.register_collector("geraata_cache_hit_ratio", "gauge", "Acertos / consultas por cache.",
+                           lambda: _cache_samples("hit_ratio"))
+metrics.register_collector("geraata_cache_hits_total", "counter", "Acertos por cache.",
+                           lambda: _cache_samples("hits"))
+metrics.register_collector("geraata_cache_misses_total", "counter", "Faltas por cache.",
+                           lambda: _cache_samples("misses"))
+metrics.register_collector("geraata_queue_items", "gauge", "PDFs na fila (todas as sessões).",
+                           lambda: STORE.count())
+metrics.register_collector("geraata_outbox_messages", "gauge", "Mensagens na caixa de saída por status.",
+                           lambda: [({"status": k}, v) for k, v in OUTBOX.store.counts().items()])
+metrics.register_collector("geraata_jobs", "gauge", "Jobs de renderização por status (neste worker).",
+                           lambda: [({"status": k}, v) for k, v in JOBS.stats().items() if k != "workers"])
+metrics.register_collector("geraata_admission", "gauge", "Admissão: vagas em uso e requisições esperando.",
+                           lambda: [({"state": k}, ADMISSION.stats()[k]) for k in ("in_flight", "waiting")])
+metrics.register_collector("geraata_admission_rejected_total", "counter", "Requisições recusadas com 429, por motivo.",
+                           lambda: [({"reason": k}, ADMISSION.stats()[f"rejected_{k}"])
+                                    for k in ("queue_full", "per_client", "timeout")])
+metrics.register_collector("geraata_sse_connections", "gauge", "Conexões SSE abertas (/events) neste worker.",
+                           lambda: EVENTS.stats()["connections"])
+metrics.register_collector("geraata_startup_seconds", "gauge", "Cold start: imports, aquecimento e 1ª requisição.",
+                           _startup_samples)
+
+# 5) GET condicional nas leituras (/options, /facets, /health, /participants):
+# ETag fraco (o corpo pode sair em gzip) da versão dos dados por trás da resposta.
+# If-None-Match (ou If-Modified-Since, sem ETag) batendo -> 304 sem montar nem
+# serializar o corpo. READ_CACHE_MAX_AGE=0 (padrão): o navegador sempre revalida.
+READ_CACHE_MAX_AGE = int(os.getenv("READ_CACHE_MAX_AGE", "0"))
+
+def _cache_control() -> str:
+    return f"private, max-age={READ_CACHE_MAX_AGE}" if READ_CACHE_MAX_AGE > 0 else "no-cache"
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in header.split(","))
+
+def _not_modified(request: Request, etag: str, last_modified: float | None) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)  # com ETag, If-Modified-Since é ignorado (RFC 9110)
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _conditional_json(request: Request, key: list, build, last_modified: float | None = None,
+                      check: bool = True) -> Response:
+    """JSON de build() com ETag/Last-Modified/Cache-Control; 304 se o cliente já tem essa versão."""
+    digest = hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()[:20]
+    headers = {"ETag": f'W/"{digest}"', "Cache-Control": _cache_control()}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if check and _not_modified(request, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(build(), headers=headers)
+
+def _participants_version(core) -> list:
+    try:
+        st = Path(core.PARTICIPANTES_XLSX_PATH).stat()
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return [None, None]
+
 @api.get("/")
 def root():
     return {"ok": True, "routes": [f"{API_PREFIX}/health", f"{API_PREFIX}/options", f"{API_PREFIX}/participants"]}
 
 @api.get("/health")
-def health():
+def health(request: Request):
     import gerar_ata_core as core
     ok_env, info = core.supabase_ping()
-    counts = core.get_counts_summary()
-    return {
-        "success": True,
-        "status": "ok",
-        "env_configured": {"SUPABASE_URL_set": info["SUPABASE_URL_set"], "SUPABASE_KEY_set": info["SUPABASE_KEY_set"]},
-        "counts": counts,
-    }
+    env = {"SUPABASE_URL_set": info["SUPABASE_URL_set"], "SUPABASE_KEY_set": info["SUPABASE_KEY_set"]}
+    build = lambda: {"success": True, "status": "ok", "env_configured": env, "counts": core.get_counts_summary()}
+    return _conditional_json(request, ["health", core.dataset_version(), env], build, core.dataset_last_modified())
 
 @api.get("/options")
-def options(ano: str | None = None, turno: str | None = None):
+def options(request: Request, ano: str | None = None, turno: str | None = None):
     import gerar_ata_core as core
-    data = core.get_dependent_options(ano=ano, turno=turno) if (ano or turno) else core.get_global_options()
-    return {"success": True, **data}
+    def build():
+        data = core.get_dependent_options(ano=ano, turno=turno) if (ano or turno) else core.get_global_options()
+        return {"success": True, **data}
+    return _conditional_json(request, ["options", core.dataset_version(), ano, turno], build,
+                             core.dataset_last_modified())
+
+@api.get("/facets")
+def facets(request: Request):
+    import gerar_ata_core as core
+    return _conditional_json(request, ["facets", core.dataset_version()],
+                             lambda: {"success": True, "tree": core.get_facet_tree()}, core.dataset_last_modified())
 
 @api.get("/participants")
-def participants(force: int = 0):
+def participants(request: Request, force: int = 0):
+    import gerar_ata_core as core
+    build = lambda: {"success": True, "participants": core.load_participantes_from_xlsx(force=bool(force))}
+    last_modified = _participants_version(core)[0]
+    return _conditional_json(request, ["participants", _participants_version(core), core.PARTICIPANTES_SHEET], build,
+                             last_modified / 1e9 if last_modified else None, check=not force)
+
+@api.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
+@api.get("/startup")
+def startup():
+    return {"success": True, **startup_report()}
+
+@api.get("/cache_stats")
+def cache_stats():
     import gerar_ata_core as core
-    lst = core.load_participantes_from_xlsx(force=bool(force))
-    return {"success": True, "participants": lst}
+    return {"success": True, "dataset": core.dataset_cache_stats(), "pdf": core.pdf_cache_stats(),
+            "drafts": core.draft_cache_stats(), "integral": core.integral_cache_stats()}
+
+@api.post("/invalidate_cache")
+def invalidate_cache():
+    # força a releitura do dados.xlsx / Supabase no próximo acesso
+    import gerar_ata_core as core
+    return {"success": True, "dataset": core.invalidate_dataset_cache()}
 
 @api.post("/compose_text")
 async def compose_text(req: Request):
     import gerar_ata_core as core
     payload = await req.json()
-    df_filt, colmap, df_base_tri = core.get_df_for_filters(
-        ano=payload.get("ano"), turno=payload.get("turno"),
-        turma=payload.get("turma"), trimestre=payload.get("trimestre")
-    )
-    txt = core.compose_text_core(
-        df_filt=df_filt, df_base_tri=df_base_tri, column_map=colmap,
-        numero_ata=payload.get("numero_ata"), data_reuniao=payload.get("data_reuniao"),
-        horario_inicio=payload.get("horario_inicio"), horario_fim=payload.get("horario_fim"),
-        presidente=payload.get("presidente"), participantes=payload.get("participantes"),
-        ano=payload.get("ano"), turma=payload.get("turma"),
-        turno=payload.get("turno"), trimestre=payload.get("trimestre"),
-    )
-    return {"success": True, "texto": txt}
+    async with _admitted(req):
+        draft = await run_in_threadpool(core.compose_draft, payload)
+    # o token volta no /queue_ata para renderizar sem recompor nem ler dados
+    return {"success": True, "texto": draft["texto"], "draft_token": draft["token"]}
 # ------------------------- Fila real / PDFs / ZIP / E-mail -------------------
 @api.get("/list_queue")
-def list_queue():
-    return {"success": True, "queue": _queue_snapshot()}
+def list_queue(req: Request):
+    return {"success": True, "queue": _queue_snapshot(_session_id(req))}
 
 @api.post("/reset_queue")
-def reset_queue():
-    # limpa lista e apaga arquivos gerados
-    for it in list(QUEUE):
+def reset_queue(req: Request):
+    # limpa a fila da sessão (atomicamente) e apaga os arquivos gerados
+    session = _session_id(req)
+    for it in STORE.reset(session):
         try:
             Path(it["path"]).unlink(missing_ok=True)
         except Exception:
             pass
-    QUEUE.clear()
-    try:
-        ZIP_PATH.unlink(missing_ok=True)
-    except Exception:
-        pass
+    _publish_queue(session)
     return {"success": True}
 
-@api.post("/queue_ata")
-async def queue_ata(req: Request):
+def _render_and_queue(payload: dict, session: str) -> dict:
     """
-    Gera um PDF com base no payload e adiciona à fila.
-    Faz uma única chamada ao create_pdf e trata ambos cenários:
-    - retorna bytes  -> salvamos em fpath
-    - salva no disco -> verificamos fpath
+    Reaproveita o rascunho do /compose_text (ou compõe, ou usa o texto editado), renderiza o PDF
+    — no process pool, se houver — e o adiciona à fila. Roda dentro de um job.
     """
     import gerar_ata_core as core
 
+    override = payload.get("texto_editado") or payload.get("override_text")
+    if override and override.strip():
+        texto = override.strip()
+    else:
+        # rascunho do /compose_text (pelo token ou pelos mesmos campos); senão compõe agora
+        _progress(session, stage="compose")
+        draft = core.get_draft(payload.get("draft_token"), payload) or core.compose_draft(payload)
+        texto = draft["texto"]
+
+    _progress(session, stage="render")
+    pdf = core.render_pdf_bytes(
+        texto, payload.get("presidente"), payload.get("participantes"), payload.get("ano"),
+        payload.get("turma"), payload.get("turno"), payload.get("trimestre"),
+        pool=core.get_process_pool(),
+    )
+
+    item = _enqueue_pdf(session, _ata_filename(payload.get("numero_ata"), payload.get("ano"), payload.get("turma"),
+                                      payload.get("turno"), payload.get("trimestre")), pdf)
+    return {"filename": item["filename"], "size": item["size"]}
+
+@api.post("/queue_ata")
+async def queue_ata(req: Request, wait: int = 0):
+    """
+    Agenda a geração do PDF em background e responde na hora com o job
+    (acompanhe em /job_status?id=...). Com ?wait=1 aguarda o término,
+    sem bloquear o event loop, e já devolve o item enfileirado.
+    """
     try:
         payload = await req.json()
     except Exception:
         form = await req.form()
         payload = dict(form)
 
-    df_filt, colmap, df_base_tri = core.get_df_for_filters(
-        ano=payload.get("ano"),
-        turno=payload.get("turno"),
-        turma=payload.get("turma"),
-        trimestre=payload.get("trimestre"),
-    )
-
-    # Nome do arquivo padrão (com sanitização básica)
-    numero_ata = str(payload.get("numero_ata") or "s-n").replace("/", "-").replace(":", "-")
-    ano  = str(payload.get("ano") or "").strip()
-    turm = str(payload.get("turma") or "").strip()
-    turn = str(payload.get("turno") or "").strip()
-    tri  = str(payload.get("trimestre") or "").strip()
-    fname = f"ATA_{numero_ata}_{ano}_{turm}_{turn}_{tri}.pdf".replace(" ", "")
-    fpath = OUT_DIR / fname
-
-    # Chama o create_pdf UMA VEZ
-    result = core.create_pdf(
-        data=df_filt,
-        numero_ata=payload.get("numero_ata"),
-        data_reuniao=payload.get("data_reuniao"),
-        horario_inicio=payload.get("horario_inicio"),
-        horario_fim=payload.get("horario_fim"),
-        presidente=payload.get("presidente"),
-        participantes=payload.get("participantes"),
-        ano=payload.get("ano"),
-        turma=payload.get("turma"),
-        turno=payload.get("turno"),
-        trimestre=payload.get("trimestre"),
-        override_text=payload.get("texto_editado") or payload.get("override_text"),
-        df_base_tri=df_base_tri,
-        column_map=colmap,
-    )
-
-    # 2) salvar o PDF retornado (BytesIO) no caminho esperado
-    if isinstance(result, (bytes, bytearray)):
-        fpath.write_bytes(result)
-    elif isinstance(result, io.BytesIO):
-        fpath.write_bytes(result.getvalue())
+    session = _session_id(req)
+    # a vaga fica com o job até ele terminar: jobs pendentes também contam
+    admitted_at = await ADMISSION.acquire(_client_key(req))
+    try:
+        job = JOBS.submit(_render_and_queue, payload, session, kind="queue_ata", session=session)
+    except BaseException:
+        ADMISSION.release(admitted_at)
+        raise
+    loop = asyncio.get_running_loop()
+    fut = JOBS.future(job["id"])
+    if fut is None:
+        ADMISSION.release(admitted_at)
     else:
-        # se sua função passar a salvar em disco futuramente, mantenha o fallback:
-        if not fpath.exists():
-            raise HTTPException(500, "create_pdf não retornou bytes e o arquivo esperado não foi encontrado.")
-
-    item = {"filename": fpath.name, "path": str(fpath), "size": fpath.stat().st_size}
-    QUEUE.append(item)
-    return {"success": True, "queued": {"filename": fpath.name, "size": fpath.stat().st_size}}
-
-
-def _send_email_via_resend(
-    subject: str,
-    body: str,
-    to_addrs: list[str],
-    attach_path: Path,
-    cc_addrs: list[str] | None = None,
-) -> tuple[bool, str]:
+        fut.add_done_callback(lambda _: ADMISSION.release_threadsafe(loop, admitted_at))
+    if wait:
+        fut = JOBS.future(job["id"])
+        if fut is not None:
+            try:
+                await asyncio.wrap_future(fut)
+            except Exception:
+                pass
+        job = JOBS.get(job["id"]) or job
+        if job["status"] != "done":
+            raise HTTPException(500, job.get("error") or "Falha ao gerar o PDF.")
+        return {"success": True, "queued": job["result"], "job": job}
+    return {"success": True, "job": job}
+
+@api.get("/job_status")
+def job_status(id: str):
+    job = JOBS.get(id)
+    if job is None:
+        raise HTTPException(404, "Job não encontrado.")
+    return {"success": True, "job": job}
+
+@api.get("/job_result")
+def job_result(id: str):
+    job = JOBS.get(id)
+    if job is None:
+        raise HTTPException(404, "Job não encontrado.")
+    if job["status"] in (PENDING, RUNNING):
+        raise HTTPException(409, f"Job ainda em andamento ({job['status']}).")
+    if job["status"] != "done":
+        return {"success": False, "error": job["error"], "job": job}
+    return {"success": True, "queued": job["result"], "job": job}
+
+@api.get("/jobs")
+def jobs_stats():
+    return {"success": True, "jobs": JOBS.stats(), "admission": ADMISSION.stats()}
+
+@api.post("/queue_batch")
+async def queue_batch(req: Request):
     """
-    Envia email via HTTP (Resend). Requer:
-      - RESEND_API_KEY no ambiente do backend
-      - SMTP_FROM (ou SMTP_USER) como remetente
+    Gera as atas de todas as turmas de um trimestre (opcionalmente só de um ano/turno)
+    numa única chamada: busca o trimestre uma vez, divide por turma em memória e
+    renderiza os PDFs em paralelo no process pool. numero_ata numérico é o da 1ª turma.
     """
-    api_key = os.getenv("RESEND_API_KEY")
-    if not api_key:
-        return False, "RESEND_API_KEY não configurada."
-    sender = os.getenv("SMTP_FROM") or os.getenv("SMTP_USER")
-    if not sender:
-        return False, "Defina SMTP_FROM ou SMTP_USER como remetente."
-
-    if not (attach_path and attach_path.exists()):
-        return False, "Anexo não encontrado para envio."
-
-    data = attach_path.read_bytes()
-    b64  = base64.b64encode(data).decode("ascii")
-
-    payload = {
-        "from": sender,
-        "to": to_addrs or [],
-        "subject": subject or "",
-        "text": body or "",
-        **({"cc": cc_addrs} if cc_addrs else {}),
-        "attachments": [{
-            "filename": attach_path.name,
-            "content": b64,
-            "contentType": "application/zip",
-        }],
-    }
-    body_json = json.dumps(payload)
+    import gerar_ata_core as core
 
-    conn = http.client.HTTPSConnection("api.resend.com", timeout=20)
     try:
-        conn.request(
-            "POST", "/emails", body=body_json,
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = await req.json()
+    except Exception:
+        form = await req.form()
+        payload = dict(form)
+    if not str(payload.get("trimestre") or "").strip():
+        raise HTTPException(400, "Informe o trimestre.")
+    session = _session_id(req)
+
+    def _run():
+        t0 = time.perf_counter()
+        _, colmap, df_base_tri = core.get_df_for_filters(
+            ano=None, turno=None, turma=None, trimestre=payload.get("trimestre"))
+        atas = core.gerar_atas_lote(
+            df_base_tri, colmap,
+            trimestre=payload.get("trimestre"),
+            numero_ata=payload.get("numero_ata"),
+            data_reuniao=payload.get("data_reuniao"),
+            horario_inicio=payload.get("horario_inicio"),
+            horario_fim=payload.get("horario_fim"),
+            presidente=payload.get("presidente"),
+            participantes=payload.get("participantes"),
+            ano=payload.get("ano") or None,
+            turno=payload.get("turno") or None,
+            on_progress=lambda done, total: _progress(session, stage="batch", done=done, total=total),
         )
-        resp = conn.getresponse()
-        text = resp.read().decode("utf-8", "ignore")
-        if 200 <= resp.status < 300:
-            return True, "E-mail enviado via Resend."
-        return False, f"Resend {resp.status}: {text}"
-    except Exception as e:
-        return False, f"Falha HTTP (Resend): {e}"
-    finally:
-        try: conn.close()
-        except Exception: pass
+        queued = []
+        for ata in atas:
+            item = _enqueue_pdf(session, _ata_filename(ata["numero_ata"], ata["ano"], ata["turma"],
+                                              ata["turno"], payload.get("trimestre")), ata["pdf"], publish=False)
+            queued.append({"filename": item["filename"], "size": item["size"]})
+        _publish_queue(session)  # um retrato só para o lote todo
+        return queued, time.perf_counter() - t0
+
+    async with _admitted(req):
+        queued, elapsed = await run_in_threadpool(_run)
+    if not queued:
+        return {"success": False, "message": "Nenhuma turma encontrada para os filtros."}
+    return {
+        "success": True,
+        "queued": queued,
+        "count": len(queued),
+        "elapsed_s": round(elapsed, 3),
+        "atas_per_sec": round(len(queued) / elapsed, 2) if elapsed > 0 else None,
+    }
 
 
 @api.post("/finalize_and_send")
@@ -315,36 +597,178 @@ async def finalize_and_send(req: Request):
         except Exception:
             _ = {}
 
-    if not QUEUE:
+    session = _session_id(req)
+    if not STORE.count(session):
         return {"success": False, "message": "Fila vazia."}
 
-    # Cria ZIP (rápido p/ PDF: STORED)
+    # O ZIP (STORED) é montado em streaming no download; aqui só calculamos o layout
     try:
-        with zipfile.ZipFile(ZIP_PATH, "w", compression=zipfile.ZIP_STORED) as z:
-            for it in QUEUE:
-                p = Path(it["path"])
-                if p.exists():
-                    z.write(p, arcname=p.name)
-        zip_size = ZIP_PATH.stat().st_size
+        plan = _zip_plan(session)
     except Exception as e:
         raise HTTPException(500, f"Falha ao zipar: {e}")
 
     # responde com a URL para download
-    download_url = f"{API_PREFIX}/download_zip"
+    download_url = f"{API_PREFIX}/download_zip" + (f"?sid={session}" if session != "default" else "")
     return {
         "success": True,
         "message": "ZIP gerado.",
-        "zip_size": zip_size,
-        "zip_name": ZIP_PATH.name,
+        "zip_size": plan.size,
+        "zip_name": _zip_name(session),
         "download_url": download_url
     }
 
 
 
+def _email_list(raw) -> list[str]:
+    if isinstance(raw, str):
+        raw = re.split(r"[,;\s]+", raw)
+    return [a.strip() for a in (raw or []) if isinstance(a, str) and a.strip()]
+
+@api.post("/send_atas")
+async def send_atas(req: Request):
+    """
+    Coloca os PDFs da fila da sessão na caixa de saída e responde na hora; o envio
+    é feito em background (acompanhe em /outbox).
+      - modo "zip" (padrão): uma mensagem para `to` com o ZIP da fila — ou várias
+        ("parte i/n"), se o ZIP passar do limite do provedor (EMAIL_MAX_BYTES);
+      - modo "por_ata": uma mensagem por PDF, para destinatarios[filename] (ou `to`).
+    """
+    try:
+        payload = await req.json()
+    except Exception:
+        payload = dict(await req.form())
+    session = _session_id(req)
+    items = await run_in_threadpool(STORE.items, session)
+    if not items:
+        return {"success": False, "message": "Fila vazia."}
+
+    to, cc = _email_list(payload.get("to")), _email_list(payload.get("cc"))
+    subject = payload.get("subject") or "Atas do Conselho de Classe"
+    body = payload.get("body") or ""
+    destinatarios = payload.get("destinatarios") or {}
+    limite = max_attachment_bytes()
+    if (payload.get("modo") or "zip") == "por_ata":
+        envios = []
+        for it in items:
+            dest = _email_list(destinatarios.get(it["filename"])) or to
+            if not dest:
+                raise HTTPException(400, f"Sem destinatário para {it['filename']}.")
+            if (it.get("size") or 0) > limite:
+                raise HTTPException(413, f"{it['filename']} passa do limite de anexo ({limite} bytes).")
+            envios.append((dest, it))
+        mensagens = [(dest, f"{subject} — {it['filename']}",
+                      [{"path": it["path"], "filename": it["filename"], "mime": "application/pdf"}])
+                     for dest, it in envios]
+    else:
+        if not to:
+            raise HTTPException(400, "Informe os destinatários (to).")
+        partes = split_entries(items, limite)
+        base = _zip_name(session).removesuffix(".zip")
+        mensagens = []
+        for i, grupo in enumerate(partes, 1):
+            nome, assunto = (f"{base}.zip", subject) if len(partes) == 1 else \
+                (f"{base}_parte{i}de{len(partes)}.zip", f"{subject} (parte {i}/{len(partes)})")
+            mensagens.append((to, assunto, [{"zip": grupo, "filename": nome}]))
+    # fixar anexos lê e copia arquivos: fora do event loop. Tudo ou nada, para o
+    # reenvio depois de um 409 não duplicar as partes que já tinham entrado.
+    try:
+        ids = await run_in_threadpool(
+            OUTBOX.enqueue_many,
+            [{"to": dest, "cc": cc, "subject": assunto, "body": body, "attachments": anexos}
+             for dest, assunto, anexos in mensagens],
+            session)
+    except FileNotFoundError:
+        # a fila foi limpa enquanto os anexos eram fixados na caixa de saída
+        raise HTTPException(409, "A fila mudou durante o envio; tente novamente.")
+    return {"success": True, "messages": ids, "count": len(ids)}
+
+@api.get("/outbox")
+def outbox_status(req: Request, id: str | None = None):
+    if id:
+        msg = OUTBOX.store.get(id)
+        if msg is None:
+            raise HTTPException(404, "Mensagem não encontrada.")
+        return {"success": True, "message": msg}
+    return {"success": True, "stats": OUTBOX.stats(), "messages": OUTBOX.store.recent(_session_id(req))}
+
 @api.get("/download_zip")
-def download_zip():
-    if not ZIP_PATH.exists():
+def download_zip(request: Request):
+    """
+    Serve o ZIP da fila gerado sob demanda (sem materializar em disco),
+    com suporte a Range/If-Range para retomar downloads.
+    """
+    session = _session_id(request)
+    if not STORE.count(session):
         raise HTTPException(404, "ZIP não encontrado. Gere com /finalize_and_send primeiro.")
-    return FileResponse(path=str(ZIP_PATH), media_type="application/zip", filename=ZIP_PATH.name)
+    plan = _zip_plan(session)
+    etag = f'"{plan.etag}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="{_zip_name(session)}"',
+    }
+
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != etag:
+        rng = None  # arquivo mudou desde o download parcial: manda inteiro
+    try:
+        span = parse_range(rng, plan.size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{plan.size}"})
+
+    if span is None:
+        headers["Content-Length"] = str(plan.size)
+        return StreamingResponse(_timed_stream(plan.iter_range(), on_sent=_zip_progress(session, plan.size)),
+                                 media_type="application/zip", headers=headers)
+    start, end = span
+    headers["Content-Range"] = f"bytes {start}-{end}/{plan.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_timed_stream(plan.iter_range(start, end), on_sent=_zip_progress(session, end - start + 1)),
+                             status_code=206, media_type="application/zip", headers=headers)
+
+# ------------------------- Eventos (SSE) -------------------------------------
+# Substitui o polling de /list_queue e /job_status: "queue" (fila completa),
+# "job" (mudança de estado) e "progress" (compose/render/batch/zip). Eventos só
+# saem do worker que fez o trabalho; a cada SSE_HEARTBEAT o stream confere a fila
+# no store e manda o retrato se ela mudou em outro worker.
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+
+@api.get("/events")
+async def events_stream(request: Request):
+    session = _session_id(request)
+    sub = EVENTS.subscribe(session)
+    if sub is None:
+        raise HTTPException(503, "Muitas conexões de eventos; use /list_queue.")
+
+    async def _stream():
+        try:
+            snap = await run_in_threadpool(_queue_snapshot, session)
+            yield "retry: 3000\n\n" + format_sse("queue", {"queue": snap})
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(sub.queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    cur = await run_in_threadpool(_queue_snapshot, session)
+                    if cur != snap:
+                        snap = cur
+                        yield format_sse("queue", {"queue": snap})
+                    else:
+                        yield ": ping\n\n"  # mantém a conexão viva no proxy
+                    continue
+                if event == "queue":
+                    snap = data["queue"]
+                yield format_sse(event, data)
+                if sub.overflow:
+                    # eventos descartados: o retrato da fila recoloca o cliente em dia
+                    sub.overflow = False
+                    snap = await run_in_threadpool(_queue_snapshot, session)
+                    yield format_sse("queue", {"queue": snap})
+        finally:
+            EVENTS.unsubscribe(sub)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 app.include_router(api)
+STARTUP["index_import_s"] = round(time.perf_counter() - _T0, 4)
@@ -0,0 +1,124 @@
+# api/jobs.py — fila de jobs em background (renderização de PDFs)
+import os, time, uuid, threading, contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+# Quantos jobs rodam ao mesmo tempo; os demais ficam "pending" no executor.
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+# Quantos jobs terminados ficam guardados para consulta de status.
+JOBS_MAX_KEEP = int(os.getenv("JOBS_MAX_KEEP", "500"))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# id do job em execução (dentro de fn), para eventos de progresso
+CURRENT_JOB: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+
+class JobManager:
+    """
+    Executor limitado + registro de status por job id.
+    Cada job é um dict: id, kind, session, status, created_at, started_at,
+    finished_at, elapsed_s, result (dict) e error (str).
+    Com um store (ver queue_store), cada mudança de estado é gravada nele e
+    get() encontra também jobs de outros workers. listener(job), se dado, recebe
+    uma cópia do job a cada mudança de estado (não deve bloquear).
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, max_keep: int = JOBS_MAX_KEEP, store=None, listener=None):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="render")
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.max_keep = max_keep
+        self.store = store
+        self.listener = listener
+
+    def submit(self, fn, *args, kind: str = "job", session: str | None = None, **kwargs) -> dict:
+        """Agenda fn(*args, **kwargs); o retorno (dict) vira job["result"]."""
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "kind": kind, "session": session, "status": PENDING,
+               "created_at": time.time(), "started_at": None, "finished_at": None,
+               "elapsed_s": None, "result": None, "error": None}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+            self._persist(job)
+            # leva o contexto de quem agendou (ex.: etapas medidas para o Server-Timing)
+            ctx = contextvars.copy_context()
+            self._futures[job_id] = self._executor.submit(ctx.run, self._run, job_id, fn, args, kwargs)
+        return self.get(job_id)
+
+    def _persist(self, job: dict):
+        if self.store is not None:
+            try:
+                self.store.save_job(job)
+            except Exception:
+                pass  # o status em memória continua valendo para este worker
+        if self.listener is not None:
+            try:
+                self.listener(dict(job))
+            except Exception:
+                pass
+
+    def _run(self, job_id, fn, args, kwargs):
+        CURRENT_JOB.set(job_id)
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._finish(job_id, status=FAILED, error=f"{type(e).__name__}: {e}")
+            raise
+        self._finish(job_id, status=DONE, result=result)
+        return result
+
+    def _finish(self, job_id, **fields):
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields, finished_at=now)
+            job["elapsed_s"] = round(now - (job["started_at"] or job["created_at"]), 3)
+            self._persist(job)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+                self._persist(self._jobs[job_id])
+
+    def _trim(self):
+        # descarta os mais antigos já terminados
+        excess = len(self._jobs) - self.max_keep
+        for jid in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[jid]["status"] in (DONE, FAILED):
+                del self._jobs[jid]
+                self._futures.pop(jid, None)
+                if self.store is not None:
+                    try:
+                        self.store.delete_job(jid)
+                    except Exception:
+                        pass
+                excess -= 1
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        if self.store is not None:
+            return self.store.load_job(job_id)  # job de outro worker
+        return None
+
+    def future(self, job_id: str) -> Future | None:
+        with self._lock:
+            return self._futures.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        return {"workers": self._executor._max_workers, **counts}
@@ -0,0 +1,170 @@
+# api/metrics.py — métricas no formato texto do Prometheus + Server-Timing
+"""
+Sem dependências externas:
+  - histogramas de latência por endpoint (middleware ASGI) e por etapa do core
+    (fetch, infer_column_map, integral, compose, render, write, zip) via `stage(nome)`;
+  - coletores registrados pela API (hit ratio dos caches, profundidade da fila),
+    lidos na hora do scrape de /metrics;
+  - as etapas que rodaram durante a requisição saem no header Server-Timing
+    (aparece na aba Network/Timing do devtools).
+Cada worker do uvicorn tem seus próprios contadores (o Prometheus soma por instância).
+"""
+import os, time, threading, contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+BUCKETS = tuple(float(x) for x in os.getenv(
+    "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(","))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(val) -> str:
+    return str(val).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+def _num(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    """Histograma com labels fixos; cada série guarda contagens por bucket, soma e total."""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)  # primeiro bucket com le >= value
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((lbl, list(s)) for lbl, s in self._series.items())
+        for lbl, s in series:
+            acc = 0
+            for le, n in zip(self.buckets, s):
+                acc += n
+                out.append(f"{self.name}_bucket{_labels(self.labels + ('le',), lbl + (_num(le),))} {acc}")
+            out.append(f"{self.name}_bucket{_labels(self.labels + ('le',), lbl + ('+Inf',))} {s[-1]}")
+            out.append(f"{self.name}_sum{_labels(self.labels, lbl)} {_num(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labels, lbl)} {s[-1]}")
+        return out
+
+
+REQUEST_SECONDS = Histogram(
+    "geraata_request_duration_seconds", "Latência das requisições HTTP até o início da resposta.",
+    ("method", "route", "status"))
+STAGE_SECONDS = Histogram(
+    "geraata_stage_duration_seconds", "Duração das etapas internas (fetch, compose, render, ...).",
+    ("stage",))
+
+# ---------- ETAPAS ----------
+# Lista de (etapa, segundos) da requisição corrente; None fora de requisição.
+# run_in_threadpool e JobManager copiam o contexto, então etapas em threads entram também.
+_request_timings: contextvars.ContextVar[list | None] = contextvars.ContextVar("geraata_timings", default=None)
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - t0)
+
+def server_timing(timings: list, total: float | None = None) -> str:
+    """Header Server-Timing: uma entrada por etapa (somando repetições), na ordem em que apareceram."""
+    agg: dict[str, list] = {}
+    for name, sec in list(timings):
+        a = agg.setdefault(name, [0.0, 0])
+        a[0] += sec
+        a[1] += 1
+    parts = [f'{n};dur={a[0] * 1000:.1f}' + (f';desc="{a[1]}x"' if a[1] > 1 else "") for n, a in agg.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+# ---------- COLETORES ----------
+# (nome, tipo, help, fn) — fn() devolve [(dict de labels, valor)] ou um número.
+_collectors: list[tuple] = []
+
+def register_collector(name: str, kind: str, help: str, fn) -> None:
+    _collectors.append((name, kind, help, fn))
+
+def render_metrics() -> str:
+    lines = []
+    for h in (REQUEST_SECONDS, STAGE_SECONDS):
+        lines += h.render()
+    for name, kind, help, fn in _collectors:
+        try:
+            samples = fn()
+        except Exception:
+            continue  # um coletor quebrado não derruba o scrape
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for lbl, val in samples:
+            lines.append(f"{name}{_labels(tuple(lbl), tuple(lbl.values()))} {_num(val)}")
+    return "\n".join(lines) + "\n"
+
+# ---------- MIDDLEWARE ----------
+# Primeira resposta deste worker (relatório de cold start): rota, status, segundos e
+# o perf_counter de quando saiu (a API compara com o início do próprio import).
+FIRST_REQUEST: dict = {}
+
+class MetricsMiddleware:
+    """
+    ASGI puro (não bufferiza respostas em streaming): mede cada requisição HTTP,
+    rotula pelo template da rota (não pelo path cru) e injeta Server-Timing.
+    """
+
+    def __init__(self, app, route_label=None):
+        self.app = app
+        self.route_label = route_label or (lambda scope: "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: list = []
+        token = _request_timings.set(timings)
+        t0 = time.perf_counter()
+        started = []
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                started.append(message["status"])
+                elapsed = time.perf_counter() - t0
+                header = server_timing(timings, elapsed).encode("latin-1")
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", header)]}
+                route = self.route_label(scope)
+                REQUEST_SECONDS.observe(elapsed, scope["method"], route, message["status"])
+                if not FIRST_REQUEST:
+                    FIRST_REQUEST.update(route=route, status=message["status"], seconds=round(elapsed, 4),
+                                         t=time.perf_counter())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            if not started:  # exceção antes de responder: o 500 sai do ServerErrorMiddleware
+                REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], self.route_label(scope), 500)
+            _request_timings.reset(token)
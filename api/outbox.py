@@ -0,0 +1,761 @@
+# api/outbox.py — caixa de saída de e-mails (fila persistente + envio em background)
+"""
+As mensagens são gravadas em SQLite (mesmo arquivo da fila, tabela própria) e
+enviadas por uma thread que mantém UMA conexão SMTP autenticada aberta para
+várias mensagens: STARTTLS e login só quando a conexão é (re)aberta.
+
+  - conexão "happy eyeballs" (RFC 8305): endereços v6/v4 intercalados, nova
+    tentativa a cada SMTP_HE_DELAY s sem esperar a anterior falhar; vence a primeira;
+  - falha transitória (rede, 4xx) -> nova tentativa com backoff exponencial
+    (OUTBOX_BACKOFF_BASE .. OUTBOX_BACKOFF_MAX, até OUTBOX_MAX_ATTEMPTS);
+    resposta 5xx ou anexo ausente -> "failed" na hora;
+  - vários workers podem dividir a mesma caixa: cada mensagem é reservada
+    (status "sending") numa transação antes do envio;
+  - os anexos são fixados na caixa ao enfileirar (OUTBOX_SPOOL_DIR/<id>/): limpar
+    a fila ou regravar um PDF depois disso não muda o que será enviado.
+
+Transporte (EMAIL_TRANSPORT=smtp|resend; padrão: resend se houver RESEND_API_KEY):
+  - SMTP: SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS (login opcional),
+    SMTP_TLS (STARTTLS, padrão 1) e SMTP_FROM;
+  - Resend (HTTP): RESEND_API_KEY, RESEND_API_URL e SMTP_FROM como remetente.
+Nos dois, os anexos são codificados em streaming a partir do disco (ver MimeMessage).
+"""
+import os, re, json, time, uuid, queue, random, socket, sqlite3, smtplib, ssl, threading
+import base64, http.client, mimetypes, shutil, tracemalloc, zlib
+from email.header import Header
+from email.utils import formatdate, make_msgid, parseaddr, encode_rfc2231
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from zipstream import ZipPlan
+
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "900"))
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "20"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+# reserva "sending" mais velha que isso é de um worker que morreu: volta para a fila
+OUTBOX_CLAIM_TIMEOUT = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", "300"))
+# conexão ociosa é fechada depois disso (servidores derrubam por volta de 5 min)
+SMTP_IDLE_CLOSE = float(os.getenv("SMTP_IDLE_CLOSE", "60"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+SMTP_HE_DELAY = float(os.getenv("SMTP_HE_DELAY", "0.25"))
+
+PENDING, SENDING, SENT, FAILED = "pending", "sending", "sent", "failed"
+
+
+def mail_settings() -> dict:
+    port = os.getenv("SMTP_PORT", "587")
+    return {
+        "transport": (os.getenv("EMAIL_TRANSPORT") or ("resend" if os.getenv("RESEND_API_KEY") else "smtp")).lower(),
+        "resend_key": os.getenv("RESEND_API_KEY") or "",
+        "resend_url": os.getenv("RESEND_API_URL", "https://api.resend.com"),
+        "host": os.getenv("SMTP_HOST") or "",
+        "port": int(port) if str(port).isdigit() else 587,
+        "user": os.getenv("SMTP_USER") or "",
+        "password": os.getenv("SMTP_PASS") or "",
+        "tls": os.getenv("SMTP_TLS", "1") not in ("0", "false", "False"),
+        "sender": os.getenv("SMTP_FROM") or os.getenv("SMTP_USER") or "",
+    }
+
+
+# ---------- CONEXÃO (happy eyeballs) ----------
+def _interleave(infos: list) -> list:
+    """Alterna famílias de endereço, começando pela primeira que o resolver devolveu."""
+    by_family: dict = {}
+    for info in infos:
+        by_family.setdefault(info[0], []).append(info)
+    groups = list(by_family.values())
+    out = []
+    for i in range(max((len(g) for g in groups), default=0)):
+        out += [g[i] for g in groups if i < len(g)]
+    return out
+
+
+def happy_eyeballs_connect(host: str, port: int, timeout: float = SMTP_TIMEOUT,
+                           delay: float = SMTP_HE_DELAY) -> socket.socket:
+    """
+    Conecta em host:port tentando os endereços em paralelo escalonado: a próxima
+    tentativa começa após `delay` s (ou logo que a anterior falhar). Devolve o
+    primeiro socket conectado e fecha os que chegarem depois.
+    """
+    infos = _interleave(socket.getaddrinfo(host, port, type=socket.SOCK_STREAM))
+    if not infos:
+        raise OSError(f"sem endereços para {host}")
+    results: queue.Queue = queue.Queue()
+    lock = threading.Lock()
+    state = {"done": False}
+
+    def _attempt(info):
+        family, socktype, proto, _, addr = info
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(addr)
+        except OSError as e:
+            sock.close()
+            results.put((False, f"{addr[0]}: {e}"))
+            return
+        with lock:
+            late = state["done"]
+        if late:
+            sock.close()
+        else:
+            results.put((True, sock))
+
+    deadline = time.monotonic() + timeout
+    started, finished, errors = 0, 0, []
+    winner = None
+    while winner is None:
+        if started < len(infos):
+            threading.Thread(target=_attempt, args=(infos[started],), daemon=True).start()
+            started += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or finished == len(infos):
+            break
+        wait = min(delay, remaining) if started < len(infos) else remaining
+        try:
+            ok, val = results.get(timeout=wait)
+        except queue.Empty:
+            continue  # ninguém respondeu ainda: dispara o próximo endereço
+        finished += 1
+        if ok:
+            winner = val
+        else:
+            errors.append(val)
+    with lock:
+        state["done"] = True
+    while True:  # sockets que conectaram junto com o vencedor
+        try:
+            ok, val = results.get_nowait()
+        except queue.Empty:
+            break
+        if ok and val is not winner:
+            val.close()
+    if winner is None:
+        raise OSError(f"falha ao conectar em {host}:{port}: " + ("; ".join(errors) or "timeout"))
+    winner.settimeout(timeout)
+    return winner
+
+
+class _SMTP(smtplib.SMTP):
+    def _get_socket(self, host, port, timeout):
+        return happy_eyeballs_connect(host, port, timeout if timeout is not None else SMTP_TIMEOUT)
+
+
+# ---------- STORE ----------
+class OutboxStore:
+    """Mensagens em SQLite/WAL; attachments em JSON (caminhos em disco, não bytes)."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id TEXT PRIMARY KEY,
+                session TEXT,
+                data TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_by TEXT,
+                claimed_at REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                size INTEGER,
+                peak_mem INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+        """)
+        for col in ("size INTEGER", "peak_mem INTEGER"):  # caixas criadas antes dessas colunas
+            try:
+                self._conn().execute(f"ALTER TABLE outbox ADD COLUMN {col}")
+            except sqlite3.OperationalError:
+                pass
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def add(self, message: dict, session: str | None = None, msg_id: str | None = None) -> str:
+        msg_id = msg_id or uuid.uuid4().hex
+        return self.add_many([(msg_id, message)], session=session)[0]
+
+    def add_many(self, messages: list[tuple[str, dict]], session: str | None = None) -> list[str]:
+        """Grava [(id, mensagem)] numa transação só: ou entram todas, ou nenhuma."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO outbox (id, session, data, status, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(msg_id, session, json.dumps(message, ensure_ascii=False), PENDING, now, now)
+                 for msg_id, message in messages])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [msg_id for msg_id, _ in messages]
+
+    def claim(self, owner: str, limit: int = OUTBOX_BATCH) -> list[dict]:
+        """Reserva até `limit` mensagens vencidas (e reservas abandonadas) para `owner`."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, data, attempts FROM outbox WHERE (status = ? AND next_attempt_at <= ?) "
+                "OR (status = ? AND claimed_at < ?) ORDER BY next_attempt_at LIMIT ?",
+                (PENDING, now, SENDING, now - OUTBOX_CLAIM_TIMEOUT, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET status = ?, claimed_by = ?, claimed_at = ? WHERE id = ?",
+                             [(SENDING, owner, now, r["id"]) for r in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [{"id": r["id"], "attempts": r["attempts"], **json.loads(r["data"])} for r in rows]
+
+    def mark_sent(self, msg_id: str, size: int | None = None, peak_mem: int | None = None) -> None:
+        self._conn().execute(
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, sent_at = ?, last_error = NULL, "
+            "claimed_by = NULL, size = ?, peak_mem = ? WHERE id = ?", (SENT, time.time(), size, peak_mem, msg_id))
+
+    def mark_retry(self, msg_id: str, error: str, delay: float) -> None:
+        self._conn().execute(
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ?, "
+            "claimed_by = NULL WHERE id = ?", (PENDING, time.time() + delay, error, msg_id))
+
+    def mark_failed(self, msg_id: str, error: str) -> None:
+        self._conn().execute(
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, claimed_by = NULL "
+            "WHERE id = ?", (FAILED, error, msg_id))
+
+    def get(self, msg_id: str) -> dict | None:
+        row = self._conn().execute("SELECT * FROM outbox WHERE id = ?", (msg_id,)).fetchone()
+        return self._public(row) if row else None
+
+    def recent(self, session: str | None = None, limit: int = 100) -> list[dict]:
+        if session is None:
+            rows = self._conn().execute("SELECT * FROM outbox ORDER BY created_at DESC LIMIT ?", (limit,))
+        else:
+            rows = self._conn().execute(
+                "SELECT * FROM outbox WHERE session = ? ORDER BY created_at DESC LIMIT ?", (session, limit))
+        return [self._public(r) for r in rows.fetchall()]
+
+    def counts(self) -> dict:
+        out = {PENDING: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        for r in self._conn().execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status"):
+            out[r["status"]] = r["n"]
+        return out
+
+    def next_due(self) -> float | None:
+        row = self._conn().execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (PENDING,)).fetchone()
+        return row[0]
+
+    @staticmethod
+    def _public(row) -> dict:
+        data = json.loads(row["data"])
+        return {"id": row["id"], "session": row["session"], "status": row["status"],
+                "attempts": row["attempts"], "last_error": row["last_error"],
+                "created_at": row["created_at"], "sent_at": row["sent_at"],
+                "size": row["size"], "peak_mem": row["peak_mem"],
+                "next_attempt_at": row["next_attempt_at"] if row["status"] == PENDING else None,
+                "to": data.get("to"), "cc": data.get("cc"), "subject": data.get("subject"),
+                "attachments": [a.get("filename") for a in data.get("attachments", [])]}
+
+
+# ---------- MENSAGEM ----------
+class PermanentError(Exception):
+    """Falha que não melhora com nova tentativa (anexo ausente, 5xx do servidor)."""
+
+
+class ConnectError(Exception):
+    """Falha ao abrir/autenticar a conexão: a mensagem volta para a fila (a config pode ser corrigida)."""
+
+
+class TransientError(Exception):
+    """Recusa temporária do provedor (429/5xx): nova tentativa com backoff."""
+
+
+# ---------- MENSAGEM (codificada em streaming) ----------
+# Os anexos nunca ficam inteiros na memória: são lidos do disco (ou do ZIP montado
+# na hora) em blocos múltiplos de 57 bytes — uma linha base64 de 76 caracteres — e
+# codificados bloco a bloco direto para o socket. O pico fica em ~2 blocos.
+ENCODE_CHUNK = 57 * 1150  # ~64 KiB lidos por vez
+EMAIL_MAX_BYTES = int(os.getenv("EMAIL_MAX_BYTES", str(20 * 1024 * 1024)))  # mensagem codificada
+# a memória de cada envio é medida com tracemalloc (custo extra enquanto ligado)
+OUTBOX_TRACE_MEMORY = os.getenv("OUTBOX_TRACE_MEMORY", "0") not in ("0", "false", "False", "")
+_MIME_OVERHEAD = 8 * 1024  # cabeçalhos + texto, para dividir anexos dentro do limite
+_DOT = re.compile(rb"(?m)^\.")
+
+
+def b64_size(n: int, wrap: bool = True) -> int:
+    """Tamanho do base64 de n bytes: em linhas de 76 + CRLF (MIME) ou contínuo (JSON)."""
+    if not wrap:
+        return 4 * ((n + 2) // 3)
+    full, rest = divmod(n, 57)
+    return full * 78 + (4 * ((rest + 2) // 3) + 2 if rest else 0)
+
+
+def max_attachment_bytes(limit: int = EMAIL_MAX_BYTES) -> int:
+    """Maior anexo (bytes crus) que cabe numa mensagem de `limit` bytes depois do base64."""
+    return max(0, (limit - _MIME_OVERHEAD) * 57 // 78)
+
+
+def _b64_chunks(raw_chunks, wrap: bool, meter: dict):
+    carry = b""
+    for chunk in raw_chunks:
+        buf = carry + chunk if carry else chunk
+        cut = len(buf) - len(buf) % 57
+        carry = buf[cut:]
+        if cut:
+            raw = buf[:cut]
+            out = base64.encodebytes(raw).replace(b"\n", b"\r\n") if wrap else base64.b64encode(raw)
+            meter["peak"] = max(meter["peak"], len(buf) + len(out))
+            yield out
+    if carry:
+        yield base64.encodebytes(carry).replace(b"\n", b"\r\n") if wrap else base64.b64encode(carry)
+
+
+def _check_file(path: Path, size: int | None) -> int:
+    """Tamanho atual do anexo; PermanentError se sumiu ou mudou desde o enqueue (size gravado)."""
+    try:
+        actual = path.stat().st_size
+    except FileNotFoundError:
+        raise PermanentError(f"Anexo não encontrado: {path}") from None
+    if size is not None and actual != size:
+        raise PermanentError(f"Anexo alterado desde o enfileiramento: {path}")
+    return actual
+
+
+class _Attachment:
+    """
+    Anexo lido em pedaços: arquivo {"path"} ou ZIP {"zip": [itens]} montado na hora,
+    sempre a partir da cópia fixada no enqueue (pin_attachments). Cada tentativa
+    confere os tamanhos gravados: o que vai no SIZE/Content-Length é o que se lê.
+    """
+
+    def __init__(self, att: dict):
+        self.plan = None
+        if "zip" in att:
+            for e in att["zip"]:
+                _check_file(Path(e["path"]), e.get("size"))
+            self.plan = ZipPlan([{**e, "arcname": e.get("filename")} for e in att["zip"]])
+            self.filename, self.mime, self.size = att["filename"], "application/zip", self.plan.size
+            return
+        self.path = Path(att["path"])
+        self.size = _check_file(self.path, att.get("size"))
+        self.filename = att.get("filename") or self.path.name
+        self.mime = att.get("mime") or mimetypes.guess_type(self.filename)[0] or "application/octet-stream"
+
+    def chunks(self):
+        if self.plan is not None:
+            yield from self.plan.iter_range()
+            return
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(ENCODE_CHUNK), b""):
+                yield chunk
+
+
+def _header(value: str) -> str:
+    return value if value.isascii() else Header(value, "utf-8").encode(linesep="\r\n")
+
+
+class MimeMessage:
+    """
+    multipart/mixed gerado em pedaços (iterável de bytes, linhas CRLF): cabeçalhos,
+    texto em base64 e anexos em base64 lidos do disco. `size` é o tamanho exato.
+    Anexo: {"path", "filename"[, "mime"]} ou {"zip": [itens da fila], "filename"}.
+    """
+
+    def __init__(self, msg: dict, sender: str):
+        self.sender = msg.get("sender") or sender
+        self.to, self.cc = list(msg.get("to") or []), list(msg.get("cc") or [])
+        self.subject, self.body = msg.get("subject") or "", msg.get("body") or ""
+        self.attachments = [_Attachment(a) for a in msg.get("attachments", [])]
+        self.meter = {"peak": 0}
+        boundary = f"=_geraata_{uuid.uuid4().hex}"
+        head = [f"From: {_header(self.sender)}", "To: " + ",\r\n ".join(self.to)]
+        if self.cc:
+            head.append("Cc: " + ",\r\n ".join(self.cc))
+        head += [f"Subject: {_header(self.subject)}", f"Date: {formatdate(localtime=True)}",
+                 f"Message-ID: {make_msgid()}", "MIME-Version: 1.0",
+                 f'Content-Type: multipart/mixed; boundary="{boundary}"', "",
+                 f"--{boundary}", "Content-Type: text/plain; charset=utf-8",
+                 "Content-Transfer-Encoding: base64", "", ""]
+        self._head = "\r\n".join(head).encode("ascii") + \
+            base64.encodebytes(self.body.encode("utf-8")).replace(b"\n", b"\r\n")
+        self._parts = []
+        for a in self.attachments:
+            # nome ASCII vai entre aspas; os demais só na forma RFC 2231, como o email.message faz
+            if a.filename.isascii() and a.filename.isprintable() and not set('"\\') & set(a.filename):
+                ctype, disp = f'{a.mime}; name="{a.filename}"', f'attachment; filename="{a.filename}"'
+            else:
+                ctype, disp = a.mime, f"attachment; filename*={encode_rfc2231(a.filename, 'utf-8')}"
+            self._parts.append((
+                f"--{boundary}\r\nContent-Type: {ctype}\r\nContent-Disposition: {disp}\r\n"
+                f"Content-Transfer-Encoding: base64\r\n\r\n".encode("ascii"), a))
+        self._tail = f"--{boundary}--\r\n".encode("ascii")
+        self.size = len(self._head) + len(self._tail) + sum(
+            len(ph) + b64_size(a.size) for ph, a in self._parts)
+
+    def __iter__(self):
+        yield self._head
+        for ph, a in self._parts:
+            yield ph
+            yield from _b64_chunks(a.chunks(), True, self.meter)
+        yield self._tail
+
+    def recipients(self) -> list[str]:
+        return [parseaddr(a)[1] for a in self.to + self.cc if parseaddr(a)[1]]
+
+
+def smtp_send_stream(smtp: smtplib.SMTP, mime: MimeMessage) -> dict:
+    """
+    MAIL/RCPT/DATA na conexão aberta, escrevendo a mensagem em pedaços (com
+    dot-stuffing) em vez de montar tudo na memória como o send_message faz.
+    Retorna os destinatários recusados (se ao menos um foi aceito).
+    """
+    smtp.ehlo_or_helo_if_needed()
+    opts = [f"SIZE={mime.size}"] if smtp.has_extn("size") else []
+    code, resp = smtp.mail(parseaddr(mime.sender)[1], opts)
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, mime.sender)
+    refused = {}
+    rcpts = mime.recipients()
+    for rcpt in rcpts:
+        code, resp = smtp.rcpt(rcpt)
+        if code not in (250, 251):
+            refused[rcpt] = (code, resp)
+    if len(refused) == len(rcpts):
+        smtp.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, resp = smtp.docmd("data")
+    if code != 354:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    for chunk in mime:
+        smtp.send(_DOT.sub(b"..", chunk))
+    smtp.send(b".\r\n")
+    code, resp = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+def resend_send_stream(mime: MimeMessage, api_key: str, api_url: str) -> None:
+    """
+    POST /emails da Resend com o JSON gerado em pedaços: o base64 de cada anexo é
+    escrito direto no socket (Content-Length calculado antes).
+    """
+    head = json.dumps({"from": mime.sender, "to": mime.to, **({"cc": mime.cc} if mime.cc else {}),
+                       "subject": mime.subject, "text": mime.body})[:-1] + ', "attachments": ['
+    parts = []
+    for i, a in enumerate(mime.attachments):
+        pre = (", " if i else "") + json.dumps({"filename": a.filename, "contentType": a.mime})[:-1] + ', "content": "'
+        parts.append((pre.encode(), a, b'"}'))
+    tail = b"]}"
+    length = len(head) + len(tail) + sum(len(pre) + b64_size(a.size, wrap=False) + len(post)
+                                         for pre, a, post in parts)
+    url = urlsplit(api_url)
+    conn_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    conn = conn_cls(url.netloc, timeout=SMTP_TIMEOUT)
+    try:
+        conn.putrequest("POST", url.path.rstrip("/") + "/emails")
+        conn.putheader("Authorization", f"Bearer {api_key}")
+        conn.putheader("Content-Type", "application/json")
+        conn.putheader("Content-Length", str(length))
+        conn.endheaders()
+        conn.send(head.encode())
+        for pre, a, post in parts:
+            conn.send(pre)
+            for chunk in _b64_chunks(a.chunks(), False, mime.meter):
+                conn.send(chunk)
+            conn.send(post)
+        conn.send(tail)
+        resp = conn.getresponse()
+        text = resp.read().decode("utf-8", "ignore")[:500]
+    finally:
+        conn.close()
+    if resp.status == 429 or resp.status >= 500:
+        raise TransientError(f"Resend {resp.status}: {text}")
+    if not 200 <= resp.status < 300:
+        raise PermanentError(f"Resend {resp.status}: {text}")
+
+
+# ---------- ANEXOS FIXADOS ----------
+# Os PDFs da fila podem sumir (/reset_queue) ou ser regravados (mesmo filename)
+# antes do envio, e uma nova tentativa precisa mandar os mesmos bytes. enqueue()
+# faz um hardlink (ou cópia, em outro disco) de cada arquivo em OUTBOX_SPOOL_DIR/<id>/
+# e a mensagem só aponta para lá; a pasta é apagada quando ela é enviada ou falha.
+def _pin_file(src: Path, dest: Path) -> Path:
+    try:
+        os.link(src, dest)
+    except FileNotFoundError:
+        raise
+    except OSError:  # outro sistema de arquivos, sem suporte a links...
+        shutil.copyfile(src, dest)
+    return dest
+
+
+def _file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(ENCODE_CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def pin_attachments(attachments: list[dict], spool: Path) -> list[dict]:
+    """
+    Cópia dos anexos em `spool`. Itens de ZIP levam tamanho e CRC do arquivo fixado
+    (não os da fila, que podem ser de outra versão). FileNotFoundError se algum sumiu.
+    """
+    spool.mkdir(parents=True, exist_ok=True)
+    out, n = [], 0
+    for att in attachments:
+        if "zip" in att:
+            entries = []
+            for e in att["zip"]:
+                n += 1
+                dest = _pin_file(Path(e["path"]), spool / f"{n}.part")
+                entries.append({**e, "path": str(dest), "size": dest.stat().st_size, "crc32": _file_crc32(dest)})
+            out.append({**att, "zip": entries})
+        else:
+            n += 1
+            dest = _pin_file(Path(att["path"]), spool / f"{n}.part")
+            out.append({**att, "filename": att.get("filename") or Path(att["path"]).name,
+                        "path": str(dest), "size": dest.stat().st_size})
+    return out
+
+
+def backoff_delay(attempt: int) -> float:
+    """Atraso antes da tentativa seguinte à `attempt`-ésima falha (com jitter de ±20%)."""
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** max(0, attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+# ---------- ENVIO ----------
+class Outbox:
+    """
+    Caixa de saída: enqueue() grava e acorda a thread de envio, que reaproveita
+    a mesma conexão SMTP enquanto houver mensagens (e até SMTP_IDLE_CLOSE ociosa).
+    """
+
+    def __init__(self, store: OutboxStore, settings: dict | None = None, spool_dir: Path | None = None):
+        self.store = store
+        self.settings = settings
+        self.spool_dir = Path(spool_dir) if spool_dir is not None else None  # None: anexos não são fixados
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._smtp = None
+        self._last_used = 0.0
+        self._stats = {"connections": 0, "sent": 0, "retries": 0, "failed": 0, "last_error": None,
+                       "bytes_sent": 0, "peak_mem_bytes": 0}
+
+    def _settings(self) -> dict:
+        return self.settings or mail_settings()
+
+    def _release(self, msg_id: str) -> None:
+        if self.spool_dir is not None:
+            shutil.rmtree(self.spool_dir / msg_id, ignore_errors=True)
+
+    # --- API ---
+    def enqueue(self, to: list[str], subject: str, body: str = "", attachments: list[dict] | None = None,
+                cc: list[str] | None = None, session: str | None = None) -> str:
+        """Grava a mensagem (com os anexos já fixados) e acorda o envio. FileNotFoundError se um anexo sumiu."""
+        return self.enqueue_many([{"to": to, "cc": cc, "subject": subject, "body": body,
+                                   "attachments": attachments}], session=session)[0]
+
+    def enqueue_many(self, messages: list[dict], session: str | None = None) -> list[str]:
+        """
+        Várias mensagens ({"to", "cc", "subject", "body", "attachments"}) de uma vez:
+        fixa os anexos de todas antes de gravar qualquer uma, e grava numa transação.
+        Se um anexo sumiu (FileNotFoundError) ou a gravação falhou, nada fica na fila.
+        """
+        ids = [uuid.uuid4().hex for _ in messages]
+        try:
+            rows = []
+            for msg_id, m in zip(ids, messages):
+                attachments = list(m.get("attachments") or [])
+                if self.spool_dir is not None and attachments:
+                    attachments = pin_attachments(attachments, self.spool_dir / msg_id)
+                rows.append((msg_id, {"to": list(m["to"]), "cc": list(m.get("cc") or []), "subject": m["subject"],
+                                      "body": m.get("body") or "", "attachments": attachments}))
+            self.store.add_many(rows, session=session)
+        except BaseException:
+            for msg_id in ids:
+                self._release(msg_id)
+            raise
+        self.start()
+        self._wake.set()
+        return ids
+
+    def start(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="outbox", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._disconnect()
+
+    def flush(self, timeout: float = 30) -> bool:
+        """Espera não haver mensagens vencidas na fila (útil em testes e scripts)."""
+        self.start()
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            due = self.store.next_due()
+            if self.store.counts()[SENDING] == 0 and (due is None or due > time.time()):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stats(self) -> dict:
+        return {**self._stats, **self.store.counts(), "connected": self._smtp is not None,
+                "running": bool(self._thread and self._thread.is_alive())}
+
+    # --- conexão ---
+    def _connect(self) -> smtplib.SMTP:
+        cfg = self._settings()
+        if not cfg["host"]:
+            raise ConnectError("SMTP_HOST não configurado.")
+        smtp = _SMTP(timeout=SMTP_TIMEOUT)
+        try:
+            smtp.connect(cfg["host"], cfg["port"])
+            smtp.ehlo()
+            if cfg["tls"]:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if cfg["user"]:
+                smtp.login(cfg["user"], cfg["password"])
+        except Exception as e:
+            smtp.close()
+            raise ConnectError(f"{cfg['host']}:{cfg['port']}: {type(e).__name__}: {e}") from e
+        self._stats["connections"] += 1
+        return smtp
+
+    def _disconnect(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                smtp.close()
+
+    def _send(self, mime: MimeMessage) -> None:
+        cfg = self._settings()
+        if cfg["transport"] == "resend":
+            if not cfg["resend_key"]:
+                raise ConnectError("RESEND_API_KEY não configurada.")
+            return resend_send_stream(mime, cfg["resend_key"], cfg["resend_url"])
+        # conexão aberta pode ter caído no servidor: uma reconexão imediata antes de contar falha
+        for reuse in (True, False):
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                smtp_send_stream(self._smtp, mime)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout) as e:
+                self._smtp = None
+                if not reuse:
+                    raise e
+
+    # --- laço ---
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                batch = self.store.claim(self.owner)
+            except Exception as e:
+                self._stats["last_error"] = f"store: {e}"
+                batch = []
+            for msg in batch:
+                if self._stop.is_set():
+                    break
+                self._deliver(msg)
+            if batch:
+                continue
+            if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_CLOSE:
+                self._disconnect()
+            due = self.store.next_due()
+            wait = OUTBOX_POLL_INTERVAL if due is None else max(0.05, min(OUTBOX_POLL_INTERVAL, due - time.time()))
+            if self._smtp is not None:
+                wait = min(wait, SMTP_IDLE_CLOSE)
+            self._wake.wait(wait)
+            self._wake.clear()
+        self._disconnect()
+
+    def _deliver(self, msg: dict) -> None:
+        attempt = msg["attempts"] + 1
+        tracing = OUTBOX_TRACE_MEMORY and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            mime = MimeMessage(msg, self._settings()["sender"])
+            self._send(mime)
+        except PermanentError as e:
+            self._fail(msg["id"], str(e))
+        except (ConnectError, TransientError) as e:
+            self._retry(msg["id"], str(e), attempt)
+        except smtplib.SMTPResponseException as e:
+            err = f"SMTP {e.smtp_code}: {e.smtp_error!r}"
+            if e.smtp_code >= 500:
+                self._fail(msg["id"], err)
+            else:
+                self._retry(msg["id"], err, attempt)
+        except smtplib.SMTPRecipientsRefused as e:
+            self._fail(msg["id"], f"destinatários recusados: {', '.join(e.recipients)}")
+        except Exception as e:
+            self._disconnect()
+            self._retry(msg["id"], f"{type(e).__name__}: {e}", attempt)
+        else:
+            # pico: tracemalloc do envio (se ligado) ou o maior buffer do codificador
+            peak = tracemalloc.get_traced_memory()[1] if tracing else mime.meter["peak"]
+            self.store.mark_sent(msg["id"], mime.size, peak)
+            self._release(msg["id"])
+            self._stats["sent"] += 1
+            self._stats["bytes_sent"] += mime.size
+            self._stats["peak_mem_bytes"] = max(self._stats["peak_mem_bytes"], peak)
+        finally:
+            if tracing:
+                tracemalloc.stop()
+
+    def _retry(self, msg_id: str, error: str, attempt: int) -> None:
+        self._stats["last_error"] = error
+        if attempt >= OUTBOX_MAX_ATTEMPTS:
+            return self._fail(msg_id, error)
+        self._stats["retries"] += 1
+        self.store.mark_retry(msg_id, error, backoff_delay(attempt))
+
+    def _fail(self, msg_id: str, error: str) -> None:
+        self._stats["failed"] += 1
+        self._stats["last_error"] = error
+        self.store.mark_failed(msg_id, error)
+        self._release(msg_id)
+
+
+def make_outbox(data_dir: Path) -> Outbox:
+    db = os.getenv("OUTBOX_DB_PATH") or os.getenv("QUEUE_DB_PATH") or (Path(data_dir) / "queue.sqlite3")
+    spool = os.getenv("OUTBOX_SPOOL_DIR") or (Path(data_dir) / "outbox")
+    return Outbox(OutboxStore(Path(db)), spool_dir=Path(spool))
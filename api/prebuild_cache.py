@@ -0,0 +1,48 @@
+"""
+Pré-gera o sidecar Arrow do dados.xlsx no deploy, para que o primeiro request
+não precise parsear a planilha. Usa a mesma leitura do runtime (_read_workbook:
+colunas projetadas + aba de participantes), então o arquivo é o mesmo que a API
+gravaria — e /participants também sai dele.
+
+    python api/prebuild_cache.py [--xlsx caminho/dados.xlsx] [--force]
+"""
+import argparse, sys, time
+from pathlib import Path
+
+here = Path(__file__).resolve().parent
+if str(here) not in sys.path:
+    sys.path.insert(0, str(here))
+
+import gerar_ata_core as core
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Gera o sidecar Arrow (dados.xlsx.arrow).")
+    ap.add_argument("--xlsx", type=Path, default=None, help="planilha de origem (padrão: a do core)")
+    ap.add_argument("--force", action="store_true", help="regrava mesmo se o sidecar estiver em dia")
+    args = ap.parse_args(argv)
+
+    if core.pa is None:
+        print("pyarrow não instalado; nada a fazer.", file=sys.stderr)
+        return 1
+    xlsx = args.xlsx or core._local_xlsx_path()
+    if not xlsx.exists():
+        print(f"Planilha não encontrada: {xlsx}", file=sys.stderr)
+        return 1
+    # só a assinatura decide: planilha sem aba de participantes também tem sidecar em dia
+    if not args.force and core.sidecar_is_fresh(xlsx):
+        print(f"Sidecar em dia: {core.sidecar_path(xlsx)}")
+        return 0
+
+    t0 = time.perf_counter()
+    df, participantes = core._read_workbook(xlsx, need_df=True)
+    t1 = time.perf_counter()
+    target = core.write_sidecar(df, xlsx, participantes)
+    t2 = time.perf_counter()
+    print(f"{target}: {len(df)} linhas, {len(participantes or [])} participantes — "
+          f"xlsx {t1 - t0:.2f}s, arrow {t2 - t1:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# api/queue_store.py — fila de atas por sessão, compartilhável entre workers
+"""
+Dois backends com a mesma interface:
+  - MemoryQueueStore: dict em memória (um único processo, útil em dev);
+  - SQLiteQueueStore: SQLite em modo WAL sob DATA_DIR, seguro para vários
+    workers do uvicorn no mesmo host.
+Escolha com QUEUE_STORE=sqlite|memory (padrão: sqlite).
+
+Item: {"filename", "path", "size", "crc32", "mtime"}. Reenfileirar o mesmo
+filename na mesma sessão substitui o item (o arquivo em disco também foi
+sobrescrito). Os jobs de renderização também ficam aqui, para que qualquer
+worker responda /job_status.
+"""
+import os, json, time, sqlite3, threading
+from pathlib import Path
+
+_ITEM_FIELDS = ("filename", "path", "size", "crc32", "mtime")
+
+
+class MemoryQueueStore:
+    def __init__(self):
+        self._items: dict[str, list[dict]] = {}
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def append(self, session: str, item: dict) -> dict:
+        item = {k: item.get(k) for k in _ITEM_FIELDS}
+        with self._lock:
+            items = self._items.setdefault(session, [])
+            items[:] = [it for it in items if it["filename"] != item["filename"]]
+            items.append(item)
+        return item
+
+    def items(self, session: str) -> list[dict]:
+        with self._lock:
+            return [dict(it) for it in self._items.get(session, [])]
+
+    def count(self, session: str | None = None) -> int:
+        with self._lock:
+            if session is None:
+                return sum(len(v) for v in self._items.values())
+            return len(self._items.get(session, []))
+
+    def reset(self, session: str) -> list[dict]:
+        """Esvazia a fila da sessão e devolve os itens removidos (para apagar os arquivos)."""
+        with self._lock:
+            return self._items.pop(session, [])
+
+    def save_job(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def load_job(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def delete_job(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+
+class SQLiteQueueStore:
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as c:
+            c.executescript("""
+                CREATE TABLE IF NOT EXISTS queue_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    crc32 INTEGER,
+                    mtime REAL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (session, filename)
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+
+    def _conn(self) -> sqlite3.Connection:
+        # uma conexão por thread; WAL deixa leitores e um escritor em paralelo
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def append(self, session: str, item: dict) -> dict:
+        item = {k: item.get(k) for k in _ITEM_FIELDS}
+        self._conn().execute(
+            "INSERT INTO queue_items (session, filename, path, size, crc32, mtime, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (session, filename) DO UPDATE SET path=excluded.path, size=excluded.size, "
+            "crc32=excluded.crc32, mtime=excluded.mtime, created_at=excluded.created_at",
+            (session, item["filename"], str(item["path"]), int(item["size"] or 0),
+             item["crc32"], item["mtime"], time.time()),
+        )
+        return item
+
+    def items(self, session: str) -> list[dict]:
+        rows = self._conn().execute(
+            "SELECT filename, path, size, crc32, mtime FROM queue_items "
+            "WHERE session = ? ORDER BY created_at, id", (session,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, session: str | None = None) -> int:
+        if session is None:
+            return self._conn().execute("SELECT COUNT(*) FROM queue_items").fetchone()[0]
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM queue_items WHERE session = ?", (session,)).fetchone()[0]
+
+    def reset(self, session: str) -> list[dict]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")  # lê e apaga na mesma transação
+        try:
+            rows = conn.execute(
+                "SELECT filename, path, size, crc32, mtime FROM queue_items WHERE session = ?",
+                (session,)).fetchall()
+            conn.execute("DELETE FROM queue_items WHERE session = ?", (session,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [dict(r) for r in rows]
+
+    def save_job(self, job: dict) -> None:
+        self._conn().execute(
+            "INSERT INTO jobs (id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
+            (job["id"], json.dumps(job, default=str), time.time()),
+        )
+
+    def load_job(self, job_id: str) -> dict | None:
+        row = self._conn().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def delete_job(self, job_id: str) -> None:
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+def make_store(data_dir: Path):
+    kind = os.getenv("QUEUE_STORE", "sqlite").strip().lower()
+    if kind == "memory":
+        return MemoryQueueStore()
+    return SQLiteQueueStore(Path(os.getenv("QUEUE_DB_PATH") or (Path(data_dir) / "queue.sqlite3")))
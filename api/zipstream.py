@@ -0,0 +1,149 @@
+# api/zipstream.py — ZIP (STORED) gerado sob demanda, sem arquivo intermediário
+"""
+Como os PDFs entram sem compressão e o CRC32/tamanho de cada um é conhecido
+ao enfileirar, o layout inteiro do ZIP é determinístico: dá para calcular o
+tamanho total antes de gerar e servir qualquer faixa de bytes (HTTP Range)
+lendo só o trecho necessário de cada arquivo.
+"""
+import struct, time, zlib, hashlib
+from pathlib import Path
+
+CHUNK = 64 * 1024
+_UTF8_FLAG = 0x0800          # nomes em UTF-8 (ex.: "2º")
+_VERSION = 20                # 2.0: suficiente para STORED
+_MAX_32 = 0xFFFFFFFF
+
+
+def crc32_file(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _dos_datetime(ts: float) -> tuple[int, int]:
+    t = time.localtime(ts)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class ZipPlan:
+    """
+    Layout de um ZIP STORED a partir de entradas
+    {"arcname", "path", "size", "crc32", "mtime"} (crc32/mtime opcionais: calculados do arquivo).
+    Segmentos: bytes prontos (cabeçalhos) ou trechos de arquivo.
+    """
+
+    def __init__(self, entries: list[dict]):
+        self.segments: list[tuple[int, int, object]] = []  # (offset, length, bytes | (path, size))
+        central, offset, seen = [], 0, set()
+        for e in entries:
+            path = Path(e["path"])
+            if not path.exists():
+                continue
+            name = e.get("arcname") or path.name
+            if name in seen:
+                continue
+            seen.add(name)
+            size = int(e.get("size") or path.stat().st_size)
+            crc = e.get("crc32")
+            crc = crc32_file(path) if crc is None else int(crc)
+            dos_time, dos_date = _dos_datetime(e.get("mtime") or path.stat().st_mtime)
+            bname = name.encode("utf-8")
+            local = struct.pack("<IHHHHHIIIHH", 0x04034B50, _VERSION, _UTF8_FLAG, 0,
+                                dos_time, dos_date, crc, size, size, len(bname), 0) + bname
+            if offset > _MAX_32 or size > _MAX_32:
+                raise ValueError("ZIP maior que 4 GiB não suportado (sem ZIP64).")
+            central.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, _VERSION, _VERSION,
+                                       _UTF8_FLAG, 0, dos_time, dos_date, crc, size, size,
+                                       len(bname), 0, 0, 0, 0, 0, offset) + bname)
+            offset = self._add(offset, local)
+            offset = self._add(offset, (path, size))
+        cd = b"".join(central)
+        eocd = struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central),
+                           len(cd), offset, 0)
+        offset = self._add(offset, cd)
+        self.size = self._add(offset, eocd)
+        self.count = len(central)
+        self.etag = hashlib.sha1(cd).hexdigest()  # muda se nomes/CRC/tamanhos mudarem
+
+    def _add(self, offset: int, payload) -> int:
+        length = len(payload) if isinstance(payload, bytes) else payload[1]
+        if length:
+            self.segments.append((offset, length, payload))
+        return offset + length
+
+    def iter_range(self, start: int = 0, end: int | None = None):
+        """Gera os bytes [start, end] (inclusivo) em blocos de até CHUNK bytes."""
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        for seg_off, length, payload in self.segments:
+            seg_end = seg_off + length - 1
+            if seg_end < start or seg_off > end:
+                continue
+            lo, hi = max(start, seg_off) - seg_off, min(end, seg_end) - seg_off
+            if isinstance(payload, bytes):
+                yield payload[lo:hi + 1]
+                continue
+            with open(payload[0], "rb") as f:
+                f.seek(lo)
+                remaining = hi - lo + 1
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK, remaining))
+                    if not chunk:
+                        raise IOError(f"Arquivo encolheu durante o download: {payload[0]}")
+                    remaining -= len(chunk)
+                    yield chunk
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    'bytes=a-b' | 'bytes=a-' | 'bytes=-n' -> (início, fim) inclusivos.
+    None = sem Range válido (serve o arquivo inteiro); ValueError = faixa fora do arquivo.
+    Múltiplas faixas não são suportadas e caem no arquivo inteiro.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    a, _, b = header[6:].strip().partition("-")
+    try:
+        if a == "":
+            n = int(b)
+            if n <= 0:
+                raise ValueError("faixa vazia")
+            return max(0, size - n), size - 1
+        start = int(a)
+        end = int(b) if b else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError("faixa fora do arquivo")
+    return start, min(end, size - 1)
+
+
+def entry_size(entry: dict) -> int:
+    """Bytes que uma entrada ocupa no ZIP: cabeçalho local + dados + registro central."""
+    path = Path(entry["path"])
+    name = (entry.get("arcname") or entry.get("filename") or path.name).encode("utf-8")
+    size = int(entry.get("size") or path.stat().st_size)
+    return 30 + len(name) + size + 46 + len(name)
+
+
+def split_entries(entries: list[dict], max_size: int) -> list[list[dict]]:
+    """
+    Divide as entradas, na ordem, em grupos cujo ZIP não passa de max_size bytes.
+    Uma entrada que sozinha já passa do limite fica num grupo só dela.
+    """
+    groups, current, total = [], [], 22  # 22 = registro final (EOCD)
+    for e in entries:
+        cost = entry_size(e)
+        if current and total + cost > max_size:
+            groups.append(current)
+            current, total = [], 22
+        current.append(e)
+        total += cost
+    if current:
+        groups.append(current)
+    return groups
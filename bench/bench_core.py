@@ -0,0 +1,176 @@
+"""
+Suíte de benchmarks do gerar_ata_core sobre escolas sintéticas (gen_dataset.py).
+
+    python bench/bench_core.py [--sizes P M G 9x3x30x8] [--repeat 5] [--out res.json] [--compare base.json]
+
+Tamanho = ANOSxTURMASxALUNOSxMATERIAS (presets: P, M, G). Os datasets ficam em
+--workdir e só são gerados de novo se mudarem parâmetros ou seed. O JSON de
+saída (--out) traz commit, ambiente e, por benchmark/tamanho, min/mediana/máx;
+com --compare, imprime a razão contra um resultado anterior (>1 = mais lento).
+"""
+import argparse, json, os, platform, statistics, subprocess, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "api"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+# sem Supabase e sem cache de PDF: mede sempre a fonte local e a renderização real
+for var in ("SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_ANON_KEY", "SUPABASE_SERVICE_ROLE_KEY"):
+    os.environ.pop(var, None)
+os.environ["PDF_CACHE_MAX_BYTES"] = "0"
+
+import pandas as pd
+import gerar_ata_core as core
+from gen_dataset import gerar_escola
+
+PRESETS = {"P": (3, 2, 20, 6), "M": (9, 3, 30, 8), "G": (9, 5, 35, 10)}
+ALVO = {"ano": "1º", "turno": "Manhã", "turma": "A", "trimestre": "2"}
+REUNIAO = {"numero_ata": "12", "data_reuniao": "2025-06-10", "horario_inicio": "13:30", "horario_fim": "16:00",
+           "presidente": "Maria Coordenadora", "participantes": "Prof. Ana Silva\nProf. Bruno Santos"}
+
+
+def _parse_size(raw: str) -> tuple[str, tuple]:
+    if raw in PRESETS:
+        return raw, PRESETS[raw]
+    try:
+        dims = tuple(int(x) for x in raw.lower().split("x"))
+    except ValueError:
+        dims = ()
+    if len(dims) != 4:
+        raise argparse.ArgumentTypeError(f"tamanho inválido: {raw} (use P/M/G ou ANOSxTURMASxALUNOSxMATERIAS)")
+    return raw, dims
+
+
+def _preparar(workdir: Path, dims: tuple, seed: int) -> dict:
+    anos, turmas, alunos, materias = dims
+    out = workdir / f"{anos}x{turmas}x{alunos}x{materias}-s{seed}"
+    meta = out / "meta.json"
+    if meta.exists():
+        return json.loads(meta.read_text())
+    info = gerar_escola(out, anos=anos, turmas=turmas, alunos=alunos, materias=materias, seed=seed)
+    meta.write_text(json.dumps(info))
+    return info
+
+
+def _apontar_core(info: dict) -> None:
+    """Faz o core ler o dataset sintético e zera os caches em memória."""
+    core.PARTICIPANTES_XLSX_PATH = Path(info["xlsx"])
+    core.OBJETIVOS_JSON = info["objetivos"]
+    core.objetivos_map = {}
+    core._participantes_cache.update({"mtime": None, "lista": []})
+    core.invalidate_dataset_cache()
+
+
+def _sem_sidecar(info: dict) -> None:
+    Path(core.sidecar_path(Path(info["xlsx"]))).unlink(missing_ok=True)
+
+
+def _medir(fn, repeat: int, setup=None) -> dict:
+    tempos = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    return {"min_s": min(tempos), "median_s": statistics.median(tempos), "max_s": max(tempos), "repeat": repeat}
+
+
+def _benchmarks(info: dict, repeat: int) -> list[tuple[str, dict]]:
+    colmap = dict(core.COLUMN_MAP)
+    sidecar = core.XLSX_SIDECAR
+    out = []
+
+    def _xlsx_puro():
+        _sem_sidecar(info)
+        core.XLSX_SIDECAR = False
+    try:
+        out.append(("fetch_local_df[xlsx]", _medir(core.fetch_local_df, max(1, repeat // 2), setup=_xlsx_puro)))
+    finally:
+        core.XLSX_SIDECAR = sidecar
+    if core.XLSX_SIDECAR and core.pa is not None:
+        core.fetch_local_df()  # grava o sidecar
+        out.append(("fetch_local_df[sidecar]", _medir(core.fetch_local_df, repeat)))
+
+    filtros = lambda: core.get_df_for_filters(**ALVO)
+    out.append(("get_df_for_filters[cold]", _medir(filtros, repeat, setup=core.invalidate_dataset_cache)))
+    out.append(("get_df_for_filters", _medir(filtros, repeat)))
+
+    opcoes = lambda: core.get_dependent_options(ano=ALVO["ano"], turno=ALVO["turno"])
+    out.append(("get_dependent_options[cold]", _medir(opcoes, repeat, setup=core.invalidate_dataset_cache)))
+    out.append(("get_dependent_options", _medir(opcoes, repeat)))
+
+    df_filt, colmap, df_base_tri = core.get_df_for_filters(**ALVO)
+    df_integral = core.filtra_integral_df(df_base_tri, colmap, core.normaliza_ano_num(ALVO["ano"]), ALVO["trimestre"])
+    out.append(("montar_partes_por_aluno",
+                _medir(lambda: core.montar_partes_por_aluno(df_filt, df_integral, colmap), repeat)))
+    out.append(("montar_partes_por_aluno[trimestre]",
+                _medir(lambda: core.montar_partes_por_aluno(df_base_tri, df_integral, colmap), repeat)))
+
+    args = dict(df_filt=df_filt, df_base_tri=df_base_tri, column_map=colmap, **REUNIAO,
+                ano=ALVO["ano"], turma=ALVO["turma"], turno=ALVO["turno"], trimestre=ALVO["trimestre"])
+    out.append(("compose_text_core", _medir(lambda: core.compose_text_core(**args), repeat)))
+
+    pdf_args = dict(data=df_filt, df_base_tri=df_base_tri, column_map=colmap, **REUNIAO,
+                    ano=ALVO["ano"], turma=ALVO["turma"], turno=ALVO["turno"], trimestre=ALVO["trimestre"])
+    out.append(("create_pdf", _medir(lambda: core.create_pdf(**pdf_args), repeat)))
+    return out
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _comparar(atual: dict, base: dict) -> None:
+    antes = {(r["bench"], r["size"]): r for r in base.get("results", [])}
+    print(f"\nvs {base.get('meta', {}).get('commit') or '?'} (mediana; >1 = mais lento)")
+    print(f"{'benchmark':<36} {'tam':>10} {'antes (s)':>10} {'agora (s)':>10} {'razão':>7}")
+    for r in atual["results"]:
+        b = antes.get((r["bench"], r["size"]))
+        if b is None:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] else float("inf")
+        print(f"{r['bench']:<36} {r['size']:>10} {b['median_s']:>10.4f} {r['median_s']:>10.4f} {ratio:>6.2f}x")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks do gerar_ata_core.")
+    ap.add_argument("--sizes", type=_parse_size, nargs="+", default=[_parse_size("P"), _parse_size("M")])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workdir", default=str(ROOT / "bench" / ".data"))
+    ap.add_argument("--out", help="grava o resultado em JSON")
+    ap.add_argument("--compare", help="JSON de uma execução anterior")
+    args = ap.parse_args(argv)
+
+    resultado = {
+        "meta": {
+            "commit": _git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(), "pandas": pd.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+            "repeat": args.repeat, "seed": args.seed,
+        },
+        "results": [],
+    }
+    print(f"{'benchmark':<36} {'tam':>10} {'linhas':>8} {'min (s)':>9} {'mediana (s)':>12}")
+    for label, dims in args.sizes:
+        info = _preparar(Path(args.workdir), dims, args.seed)
+        _apontar_core(info)
+        for nome, med in _benchmarks(info, args.repeat):
+            resultado["results"].append({"bench": nome, "size": label, "dims": list(dims), "rows": info["rows"], **med})
+            print(f"{nome:<36} {label:>10} {info['rows']:>8} {med['min_s']:>9.4f} {med['median_s']:>12.4f}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.compare:
+        _comparar(resultado, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
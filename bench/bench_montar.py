@@ -0,0 +1,96 @@
+"""
+Benchmark de montar_partes_por_aluno: implementação vetorizada (core) x laço
+groupby/iterrows original, com checagem de texto idêntico.
+
+    python bench/bench_montar.py [--sizes 1000 10000 100000] [--repeat 3]
+"""
+import argparse, random, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "api"))
+
+import pandas as pd
+import gerar_ata_core as core
+from gerar_ata_core import ensure_ponto
+
+
+def montar_partes_por_aluno_loop(df_filt, df_integral, column_map):
+    """Implementação original (referência), com iterrows por linha."""
+    alu_col = column_map["aluno"]
+    mat_col = column_map["materia"]
+    desc_col = column_map["descricao"]
+
+    blocos = []
+    integral_map = {}
+    if isinstance(df_integral, pd.DataFrame) and not df_integral.empty:
+        for aluno_i, gi in df_integral.groupby(alu_col):
+            pecas_i = []
+            for _, row in gi.iterrows():
+                imat = str(row.get(mat_col, "")).strip()
+                idesc = str(row.get(desc_col, "")).strip()
+                if imat and idesc:
+                    pecas_i.append(ensure_ponto(f"{imat}: {idesc}"))
+            if pecas_i:
+                integral_map[str(aluno_i).strip()] = " ".join(pecas_i)
+
+    for aluno, g in df_filt.groupby(alu_col):
+        pecas = []
+        for _, row in g.iterrows():
+            materia = str(row.get(mat_col, "")).strip()
+            desc = str(row.get(desc_col, "")).strip()
+            if materia and desc:
+                pecas.append(ensure_ponto(f"{materia}: {desc}"))
+        extra = integral_map.get(str(aluno).strip())
+        if extra:
+            pecas.append(ensure_ponto(f"Integral: {extra}"))
+        if pecas:
+            blocos.append(ensure_ponto(f"{aluno}: " + " ".join(pecas)))
+    return blocos
+
+
+DESCRICOES = ["Bom desempenho", "Precisa melhorar.", "", "  Participa!  ", "ok?", None, "Lê com fluência"]
+MATERIAS = ["Português", "Matemática", "Ciências", " Arte ", "", None, "Integral"]
+
+
+def gerar_df(n_linhas: int, seed: int = 0) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    n_alunos = max(1, n_linhas // 8)
+    alunos = [f"Aluno {i:05d}" for i in range(n_alunos)] + [" Aluno 00001", None]
+    return pd.DataFrame({
+        "aluno": [rnd.choice(alunos) for _ in range(n_linhas)],
+        "materia": [rnd.choice(MATERIAS) for _ in range(n_linhas)],
+        "descricao": [rnd.choice(DESCRICOES) for _ in range(n_linhas)],
+    })
+
+
+def _melhor(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    colmap = dict(core.COLUMN_MAP)
+    print(f"{'linhas':>8} {'laço (s)':>10} {'vetor (s)':>10} {'speedup':>8}")
+    for n in args.sizes:
+        df_filt = gerar_df(n, seed=n)
+        df_int = gerar_df(n // 4 or 1, seed=n + 1)
+        t_loop, ref = _melhor(lambda: montar_partes_por_aluno_loop(df_filt, df_int, colmap), args.repeat)
+        t_vec, out = _melhor(lambda: core.montar_partes_por_aluno(df_filt, df_int, colmap), args.repeat)
+        if out != ref:
+            print(f"ERRO: saída divergente em {n} linhas", file=sys.stderr)
+            return 1
+        print(f"{n:>8} {t_loop:>10.3f} {t_vec:>10.3f} {t_loop / t_vec:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
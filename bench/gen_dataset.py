@@ -0,0 +1,139 @@
+"""
+Gerador determinístico de uma escola sintética, no formato que o core lê:
+dados.xlsx (aba principal + aba "profs") e objetivos.json.
+
+    python bench/gen_dataset.py --out /tmp/escola --anos 9 --turmas 3 --alunos 30 --materias 8 [--seed 0]
+
+Linhas = anos × turnos × turmas × alunos × trimestres × matérias, mais as do
+Integral (turno "Integral", mesmos nomes) para a fração --integral dos alunos.
+--vazias deixa em branco uma chave (ano/turno/turma/trimestre) nessa fração das
+linhas, como numa planilha preenchida à mão.
+Mesma seed e mesmos parâmetros geram exatamente os mesmos dados.
+"""
+import argparse, json, random, sys
+from pathlib import Path
+
+import pandas as pd
+
+MATERIAS = ["Língua Portuguesa", "Matemática", "Ciências", "História", "Geografia",
+            "Arte", "Educação Física", "Língua Inglesa", "Ensino Religioso", "Projeto de Vida"]
+ATIVIDADES_INTEGRAL = ["Oficina de Leitura", "Robótica", "Xadrez", "Música", "Horta"]
+TURNOS = ("Manhã", "Tarde")
+NOMES = ["Ana", "Bruno", "Carla", "Davi", "Eduarda", "Felipe", "Gabriela", "Heitor", "Isabela", "João",
+         "Kauã", "Larissa", "Miguel", "Natália", "Otávio", "Pietra", "Rafael", "Sofia", "Theo", "Valentina"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Rodrigues",
+              "Almeida", "Nascimento", "Carvalho", "Ferreira", "Araújo", "Ribeiro", "Gomes"]
+FRASES = [
+    "Apresenta bom desempenho nas atividades propostas",
+    "Precisa de acompanhamento na leitura e na escrita",
+    "Participa das aulas com interesse",
+    "Demonstra dificuldade em operações com frações",
+    "Realiza as tarefas de casa com regularidade",
+    "Interage bem com os colegas em trabalhos em grupo",
+    "Deve melhorar a organização do caderno",
+    "Avançou na compreensão de textos",
+    "Faltou a avaliações e precisa repor conteúdos",
+]
+
+
+def _materias(n: int) -> list[str]:
+    base = MATERIAS[:n]
+    return base + [f"Componente {i + 1}" for i in range(n - len(base))]
+
+
+def _descricao(rnd: random.Random) -> str:
+    # ~10% vazias (o core ignora), o resto com 1 a 3 frases
+    if rnd.random() < 0.1:
+        return ""
+    return ". ".join(rnd.sample(FRASES, rnd.randint(1, 3)))
+
+
+def _nome(rnd: random.Random, usados: set) -> str:
+    while True:
+        nome = f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}"
+        if nome not in usados:
+            usados.add(nome)
+            return nome
+        nome = f"{nome} {len(usados)}"
+        if nome not in usados:
+            usados.add(nome)
+            return nome
+
+
+def gerar_linhas(anos=9, turmas=3, alunos=30, materias=8, trimestres=3, integral=0.3, seed=0,
+                 vazias=0.0) -> pd.DataFrame:
+    rnd = random.Random(seed)
+    mats = _materias(materias)
+    usados: set = set()
+    rows = []
+    for ano in range(1, anos + 1):
+        for turno in TURNOS:
+            for t in range(turmas):
+                turma = chr(ord("A") + t)
+                nomes = [_nome(rnd, usados) for _ in range(alunos)]
+                integrais = [n for n in nomes if rnd.random() < integral]
+                for tri in range(1, trimestres + 1):
+                    for nome in nomes:
+                        for mat in mats:
+                            rows.append((f"{ano}º", turno, turma, tri, nome, mat, _descricao(rnd)))
+                    for nome in integrais:
+                        for atv in rnd.sample(ATIVIDADES_INTEGRAL, 2):
+                            rows.append((f"{ano}º", "Integral", turma, tri, nome, atv, _descricao(rnd)))
+    if vazias > 0:
+        # gerador à parte: com vazias=0 os dados continuam idênticos aos de antes
+        rnd_v = random.Random(seed + 2)
+        for i, row in enumerate(rows):
+            if rnd_v.random() < vazias:
+                k = rnd_v.randrange(4)
+                rows[i] = row[:k] + (None,) + row[k + 1:]
+    return pd.DataFrame(rows, columns=["ano", "turno", "turma", "trimestre", "aluno", "materia", "descricao"])
+
+
+def gerar_objetivos(anos=9, materias=8, trimestres=3, seed=0) -> dict:
+    rnd = random.Random(seed + 1)
+    return {
+        str(ano): {
+            str(tri): {mat: "; ".join(rnd.sample(FRASES, 3)) for mat in _materias(materias)}
+            for tri in range(1, trimestres + 1)
+        }
+        for ano in range(1, anos + 1)
+    }
+
+
+def gerar_escola(out_dir, anos=9, turmas=3, alunos=30, materias=8, trimestres=3, integral=0.3, seed=0,
+                 vazias=0.0) -> dict:
+    """Grava dados.xlsx e objetivos.json em out_dir. Retorna {"xlsx", "objetivos", "rows"}."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    df = gerar_linhas(anos, turmas, alunos, materias, trimestres, integral, seed, vazias)
+    profs = pd.DataFrame({"Professor": [f"Prof. {n} {s}" for n, s in zip(NOMES, SOBRENOMES)]})
+    xlsx = out / "dados.xlsx"
+    with pd.ExcelWriter(xlsx, engine="openpyxl") as w:
+        df.to_excel(w, index=False)
+        profs.to_excel(w, sheet_name="profs", index=False)
+    objetivos = out / "objetivos.json"
+    objetivos.write_text(json.dumps(gerar_objetivos(anos, materias, trimestres, seed), ensure_ascii=False, indent=2),
+                         encoding="utf-8")
+    return {"xlsx": str(xlsx), "objetivos": str(objetivos), "rows": int(len(df))}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Gera dados.xlsx e objetivos.json sintéticos.")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--anos", type=int, default=9)
+    ap.add_argument("--turmas", type=int, default=3, help="turmas por ano e turno")
+    ap.add_argument("--alunos", type=int, default=30, help="alunos por turma")
+    ap.add_argument("--materias", type=int, default=8)
+    ap.add_argument("--trimestres", type=int, default=3)
+    ap.add_argument("--integral", type=float, default=0.3, help="fração de alunos no Integral")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--vazias", type=float, default=0.0, help="fração de linhas com uma chave em branco")
+    args = ap.parse_args(argv)
+    info = gerar_escola(args.out, args.anos, args.turmas, args.alunos, args.materias,
+                        args.trimestres, args.integral, args.seed, args.vazias)
+    print(json.dumps(info, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
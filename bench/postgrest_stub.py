@@ -0,0 +1,205 @@
+"""
+Servidor mínimo compatível com o PostgREST (subconjunto usado pelo core),
+para testar a integração Supabase sem rede:
+
+    python bench/postgrest_stub.py --xlsx api/data/dados.xlsx --port 54321 [--max-rows 500]
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=x uvicorn ...
+
+Suporta GET /rest/v1/<tabela> com select=, filtros col=eq.v / gt. / gte. / lt. / lte.
+/ in.(a,b) / is.null (com not. na frente para negar), or=(...) com and(...) aninhado,
+order=col[.asc|.desc][,col2...], offset/limit ou header Range, e Prefer: count=exact
+(Content-Range). --max-rows simula o db-max-rows do PostgREST. Para simular
+escritas (sync incremental), altere Table.rows sob Table.lock.
+"""
+import argparse, json, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl
+
+import pandas as pd
+
+_OPS = {
+    "eq": lambda a, b: a == b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+def _coerce(raw: str, sample):
+    """Converte o valor do filtro para o tipo da coluna (PostgREST compara tipado)."""
+    if isinstance(sample, bool):
+        return raw == "true"
+    if isinstance(sample, int):
+        try: return int(raw)
+        except ValueError: return raw
+    if isinstance(sample, float):
+        try: return float(raw)
+        except ValueError: return raw
+    return raw
+
+
+def _split_top(raw: str) -> list[str]:
+    """Divide por vírgulas fora de parênteses e de aspas."""
+    out, depth, quoted, cur = [], 0, False, ""
+    for ch in raw:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch in "()":
+            depth += 1 if ch == "(" else -1
+        elif not quoted and depth == 0 and ch == ",":
+            out.append(cur)
+            cur = ""
+            continue
+        cur += ch
+    return out + [cur] if cur else out
+
+
+def _unquote(raw: str) -> str:
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return raw
+
+
+def _predicate(col: str, spec: str, sample):
+    """col + 'op.valor' (com not. opcional) -> função(linha) -> bool."""
+    negate = spec.startswith("not.")
+    if negate:
+        spec = spec[4:]
+    op, _, raw = spec.partition(".")
+    if op == "in":
+        wanted = {_coerce(_unquote(v.strip()), sample) for v in _split_top(raw.strip()[1:-1])}
+        test = lambda v: v is not None and v in wanted
+    elif op == "is":
+        target = {"null": None, "true": True, "false": False}[raw]
+        test = lambda v: v is target if target is None else v == target
+    elif op in _OPS:
+        wanted = _coerce(_unquote(raw), sample)
+        test = lambda v: v is not None and _OPS[op](v, wanted)
+    else:
+        raise ValueError(f"operador não suportado: {op}")
+    return (lambda r: not test(r.get(col))) if negate else (lambda r: test(r.get(col)))
+
+
+def _logic(expr: str, rows: list[dict]):
+    """Expressão do or=(...): 'col.op.v' ou and(...)/or(...) aninhados."""
+    for kind, combine in (("and(", all), ("or(", any)):
+        if expr.startswith(kind) and expr.endswith(")"):
+            preds = [_logic(p, rows) for p in _split_top(expr[len(kind):-1])]
+            return lambda r: combine(p(r) for p in preds)
+    col, _, spec = expr.partition(".")
+    if rows and col not in rows[0]:
+        raise KeyError(col)
+    return _predicate(col, spec, next((r.get(col) for r in rows if r.get(col) is not None), None))
+
+
+class Table:
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def query(self, params: list[tuple[str, str]], range_header: str | None, max_rows: int | None):
+        with self.lock:
+            self.requests += 1
+            rows = list(self.rows)
+        select, order, offset, limit = "*", None, 0, None
+        for key, val in params:
+            if key == "select":
+                select = val
+            elif key == "order":
+                order = val
+            elif key == "offset":
+                offset = int(val)
+            elif key == "limit":
+                limit = int(val)
+            elif key == "or":
+                pred = _logic(f"or{val}", rows)
+                rows = [r for r in rows if pred(r)]
+            else:
+                pred = _logic(f"{key}.{val}", rows)
+                rows = [r for r in rows if pred(r)]
+        if order:
+            # várias chaves: ordenações estáveis da última para a primeira
+            for part in reversed(order.split(",")):
+                col, _, direction = part.partition(".")
+                if rows and col not in rows[0]:
+                    raise KeyError(col)
+                rows.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=direction == "desc")
+        if range_header and limit is None:
+            a, _, b = range_header.partition("-")
+            offset, limit = int(a), int(b) - int(a) + 1
+        total = len(rows)
+        if max_rows is not None:
+            limit = max_rows if limit is None else min(limit, max_rows)
+        page = rows[offset: offset + limit if limit is not None else None]
+        if select != "*":
+            cols = [c.strip() for c in select.split(",") if c.strip()]
+            page = [{c: r.get(c) for c in cols} for r in page]
+        return page, offset, total
+
+
+def make_handler(tables: dict[str, Table], max_rows: int | None):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            name = url.path.rstrip("/").rsplit("/", 1)[-1]
+            table = tables.get(name)
+            if table is None:
+                return self._send(404, {"message": f"relation {name} does not exist"})
+            try:
+                page, offset, total = table.query(parse_qsl(url.query), self.headers.get("Range"), max_rows)
+            except (KeyError, ValueError) as e:
+                return self._send(400, {"code": "42703", "message": f"column error: {e}"})
+            end = offset + len(page) - 1
+            count = str(total) if "count=exact" in (self.headers.get("Prefer") or "") else "*"
+            rng = f"{offset}-{end}/{count}" if page else f"*/{count}"
+            self._send(200, page, {"Content-Range": rng})
+
+    return Handler
+
+
+def load_rows(xlsx: str) -> list[dict]:
+    df = pd.read_excel(xlsx, engine="openpyxl")
+    df.insert(0, "id", range(1, len(df) + 1))
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+def serve(rows: list[dict], port: int = 0, table: str = "respostas", max_rows: int | None = None):
+    """Sobe o stub em thread; devolve (server, Table). port=0 escolhe uma porta livre."""
+    t = Table(rows)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler({table: t}, max_rows))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, t
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Stub PostgREST para testes locais.")
+    ap.add_argument("--xlsx", required=True)
+    ap.add_argument("--port", type=int, default=54321)
+    ap.add_argument("--table", default="respostas")
+    ap.add_argument("--max-rows", type=int, default=None)
+    args = ap.parse_args(argv)
+    server, _ = serve(load_rows(args.xlsx), args.port, args.table, args.max_rows)
+    print(f"PostgREST stub em http://127.0.0.1:{server.server_address[1]}/rest/v1/{args.table}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()